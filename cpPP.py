@@ -7,6 +7,21 @@ import sys
 import os
 #import codecs
 import shutil
+import errno
+import stat
+import struct
+import hashlib
+import threading
+import queue
+import time
+import json
+import zlib
+import argparse
+import signal
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, defaultdict, OrderedDict
 
 from PowerWalk import PowerWalk, PWType
 
@@ -16,11 +31,16 @@ isMac = (sys.platform == "darwin")
 try:
     import rsrcfork
 except ImportError:
-    rscfork = None
+    rsrcfork = None
     if (isMac): sys.stderr.write(
         "Warning: Seems to be MacOS, but pip 'rsrcfork' not found. " +
         "Resource forks will not be handled.")
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 __metadata__ = {
     "title"        : "cpPP",
     "description"  : "cp command, but with some additions.",
@@ -29,7 +49,7 @@ __metadata__ = {
     "type"         : "http://purl.org/dc/dcmitype/Software",
     "language"     : "Python 3.7",
     "created"      : "2021-11-09",
-    "modified"     : "2021-11-17",
+    "modified"     : "2026-10-17",
     "publisher"    : "http://github.com/sderose",
     "license"      : "https://creativecommons.org/licenses/by-sa/3.0/"
 }
@@ -51,8 +71,63 @@ if `--resourceForks` is set;
 if the pip `rsrcfork` library is found; and
 if a like-named `.rsrc` file does not already exist at the target, or --force is set.
 
-Uses Python `copy` by default (which does not preserve metadata other than permissions).
-With `-p`, uses `copy2` (which "Attempts to preserve file metadata").
+Permissions are always copied; with `-p`, times and extended attributes
+are too (as by `shutil.copystat`).
+
+==Copy methods==
+
+`--copyMethod` picks how the data moves: ''reflink'' (a copy-on-write
+clone, on filesystems such as btrfs and XFS), ''copy_file_range'' and
+''sendfile'' (copying inside the kernel), or ''userspace'' (a plain
+read/write loop of `--bufferSize` bytes). A method the system or
+filesystem refuses (or one that stops before the end of the source's
+data) falls back to the next in that order, with the target range
+truncated first, much as `shutil` does.
+
+With ''auto'' (the default) each file starts with the method that last
+worked for the same pair of source and target devices, so the probing
+only costs anything on the first file. `--verify` always copies in
+userspace (the data must pass through cpPP to be hashed), and
+`--pipeline` takes over for big ranges.
+
+==Parallel copying==
+
+With `--jobs N` (N > 1), the actual data copies are handed to a pool of N
+worker threads, while the traversal and conflict resolution keep going
+in the main thread. At most `--queueDepth` copies (default 4*N) are
+outstanding at once, so a huge tree does not pile up in memory.
+
+Choosing the target name (including `--maxPulls` and serial-number
+renaming) always happens in the main thread, and each chosen name is
+reserved before the next file is considered, so two copies never
+race for the same name. `-v` output is still printed in traversal order.
+
+Existing names in each target directory are read once (with scandir) and
+kept in memory, along with the names this run has used, so most conflict
+checks need no stat. A name not found there gets one `lstat` to make sure,
+which catches names that differ only in case on a case-insensitive
+filesystem, and files created in the target by other processes during the
+run. Serial numbers continue from the last one used for a given name and
+directory, so flattening many same-named files into one directory stays
+fast.
+
+With `-R`, a directory given as a source is copied to a like-named
+directory under the target, creating directories as needed. Directories
+are walked with an explicit stack (so very deep trees are fine) in name
+order. Symbolic links to directories are only followed with
+`--followLinks`, in which case each directory's device and inode are
+remembered, so a symlink loop is reported and skipped instead of
+copying forever.
+
+==Metadata-only sync==
+
+With `--metadataOnly`, no data is copied at all. Each source file (and,
+with `-R`, directory) is compared by `stat` with the like-named target,
+and only the owner, permissions, times, and extended attributes that
+differ are set. This is a quick repair pass for trees whose data is
+already right, say after an `rsync` without `-a`. Targets that are
+missing, or that differ in type or size, are reported and left alone.
+Changing owners generally requires running as root.
 
 ==Usage==
 
@@ -75,7 +150,6 @@ Mac resource forks and hidden file-type codes are not copied. See [https://docs.
 See [https://pypi.org/project/rsrcfork/].
 * Option to append instead of overwrite.
 * Option to replace only if newer.
-* Options to skip if identical.
 * Shorten up path printing with -v.
 * -c and -x are not yet supported.
 
@@ -91,6 +165,17 @@ This doesn't look viable, esp. when you can just use regular `cp -c` if needed.
 
 * 2021-11-09: Written by Steven J. DeRose.
 * 2021-11-17: Rudimentary support for old Mac resource forks. Add `--newer`.
+* 2026-10-17: Add `--jobs` to overlap copies using a worker pool.
+Add `--copyMethod` (reflink, copy_file_range, sendfile).
+Add `--skipIdentical` with a persistent digest cache.
+Copy via temporary name and rename. Add `--resume`.
+Add `--delta`. Preserve holes in sparse files.
+Add `--prescan`, `--progress`, and `--statsJson`.
+Add `--plan`, `--executePlan`, and `--shard`.
+Add `--hardLinks` and `--dedupe`.
+Add `--maxBandwidth`, `--maxFilesPerSec`, `--ioIdle`, `--controlFile`.
+Add `--smallFiles`. Walk directories iteratively with scandir.
+Add `--verify` and `--verifyMode`. Add `--pipeline`. Add `--metadataOnly`.
 
 =Rights=
 
@@ -114,53 +199,689 @@ def fatal(msg:str) -> None: log(0, msg); sys.exit()
 
 nDirsSkipped = 0
 
+# Counters for the closing summary. Workers update these, so use tally().
+statsLock = threading.Lock()
+counts = defaultdict(int)
+
+def tally(key:str, n:int=1) -> None:
+    with statsLock:
+        counts[key] += n
+
+# Seconds spent per phase (walk, stat, conflict, copy, metadata). The copy
+# and metadata phases are summed across worker threads.
+phaseTimes = defaultdict(float)
+
+@contextmanager
+def phase(name:str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        with statsLock:
+            phaseTimes[name] += dt
+
+###############################################################################
+# Parallel copies. Target names are chosen in the main thread; only
+# doTheCopy() runs in the workers. Names handed out but not yet written
+# are kept in 'reserved' (with their futures), so the conflict checks
+# below see them, and links to them can wait until they are done.
+#
+pool = None
+pending = deque()
+reserved = {}  # target path -> Future
+
+###############################################################################
+# Target-name index. Each target directory is scanned once (on first use),
+# and names are added as copies are dispatched, so most conflict checks are
+# set lookups. A name not in the set still gets one lstat() to confirm it,
+# since on a case-insensitive filesystem (the macOS default) 'README' is
+# taken when 'readme' is there; that also catches files some other process
+# created in the target during the run.
+#
+targetNames = {}   # target dir -> set of names in it
+nextSerial = {}    # (target dir, basename) -> first serial not known taken
+
+def namesIn(dirpath:str) -> set:
+    names = targetNames.get(dirpath)
+    if (names is None):
+        names = set()
+        try:
+            with os.scandir(dirpath or ".") as it:
+                for entry in it: names.add(entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        targetNames[dirpath] = names
+    return names
+
+def targetExists(path:str) -> bool:
+    dirpath, basename = os.path.split(path)
+    names = namesIn(dirpath)
+    if (basename in names): return True
+    try:
+        os.lstat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return False
+    names.add(basename)
+    return True
+
+def claimName(path:str) -> None:
+    dirpath, basename = os.path.split(path)
+    namesIn(dirpath).add(basename)
+
+def dispatchCopy(ipath:str, opath:str, overwrite:bool=False,
+    linkFrom:tuple=None) -> str:
+    """Copy now, or (with --jobs) queue the copy for a worker thread.
+    If linkFrom is (kind, earlierTarget), link instead of copying.
+    """
+    claimName(opath)
+    throttleFiles()
+    if (pool is None):
+        if (linkFrom):
+            doTheLink(ipath, opath, overwrite, linkFrom)
+        else:
+            doTheCopy(ipath, opath, overwrite)
+        reportCopy(ipath, opath)
+        return opath
+    if (linkFrom):
+        fut = pool.submit(doTheLink, ipath, opath, overwrite, linkFrom,
+            reserved.get(linkFrom[1]))
+    else:
+        fut = pool.submit(doTheCopy, ipath, opath, overwrite)
+    reserved[opath] = fut
+    pending.append((ipath, opath, fut))
+    while (len(pending) > args.queueDepth):
+        finishOldest()
+    return opath
+
+def finishOldest() -> None:
+    """Wait for the oldest queued copy, so reports stay in traversal order.
+    """
+    ipath, opath, fut = pending.popleft()
+    try:
+        fut.result()
+    finally:
+        if (reserved.get(opath) is fut): del reserved[opath]
+    reportCopy(ipath, opath)
+
+def finishAll() -> None:
+    while (pending):
+        finishOldest()
+
+def reportCopy(ipath:str, opath:str) -> None:
+    if (args.verbose): print("%s -> %s" % (ipath, opath))
+    if (args.progress): showProgress()
+
+###############################################################################
+# Plans. With --plan, each decision is written as a JSON line instead of
+# being carried out; --executePlan carries out a saved plan (or one shard).
+#
+planFile = None
+
+def writePlanEntry(ipath:str, opath:str, action:str, reason:str,
+    linkFrom:tuple=None) -> None:
+    rec = {
+        "source": ipath,
+        "destination": opath,
+        "action": action,
+        "reason": reason,
+        "size": os.path.getsize(ipath),
+    }
+    if (linkFrom):
+        rec["linkKind"], rec["linkTo"] = linkFrom
+    planFile.write(json.dumps(rec) + "\n")
+
+def parseShard(s:str) -> (int, int):
+    """Parse "K/N" (1 <= K <= N) for --shard.
+    """
+    try:
+        k, n = [ int(x) for x in s.split("/") ]
+    except ValueError:
+        raise argparse.ArgumentTypeError("--shard must be K/N, not '%s'." % (s))
+    if (n < 1 or not (1 <= k <= n)):
+        raise argparse.ArgumentTypeError("--shard needs 1 <= K <= N, not '%s'." % (s))
+    return k, n
+
+def inShard(rec:dict) -> bool:
+    """Shards go by destination, so all entries for one target path (say,
+    a copy and a later overwrite) land in the same shard, in order. Links
+    go with the target they link to.
+    """
+    if (not args.shard): return True
+    k, n = args.shard
+    key = rec.get("linkTo") or rec["destination"]
+    return (zlib.crc32(key.encode("utf-8")) % n == k-1)
+
+def executePlan(path:str) -> None:
+    """Carry out the entries of a saved plan (just this --shard, if set).
+    Entries whose destination has appeared since the plan was made are
+    skipped (with a warning) unless they were planned as overwrites or
+    --force is set.
+    """
+    with open(path) as ifh:
+        for lnum, line in enumerate(ifh):
+            if (not line.strip()): continue
+            try:
+                rec = json.loads(line)
+                action, source, opath = (rec["action"], rec["source"],
+                    rec["destination"])
+            except (ValueError, KeyError, TypeError) as e:
+                error("Bad plan entry at line %d of '%s': %s" % (lnum+1, path, e))
+                sys.exit(1)
+            if (action == "skip" or not inShard(rec)): continue
+            overwrite = (action == "overwrite")
+            if (not overwrite and not args.force and os.path.exists(opath)):
+                warning0("Skipping plan entry for '%s' (now exists)." % (opath))
+                continue
+            os.makedirs(os.path.dirname(opath) or ".", exist_ok=True)
+            linkFrom = None
+            if (rec.get("linkTo")):
+                linkFrom = (rec.get("linkKind", "hardlink"), rec["linkTo"])
+            dispatchCopy(source, opath, overwrite=overwrite,
+                linkFrom=linkFrom)
+
+###############################################################################
+# Throttling. Copies draw from a token bucket of bytes (--maxBandwidth)
+# and one of files (--maxFilesPerSec). A rate of 0 means no limit.
+# The limits can be changed while running via --controlFile.
+#
+class TokenBucket:
+    """Allow on average 'rate' units per second, with bursts of up to one
+    second's worth. take() sleeps as needed. Safe to share among threads.
+    """
+    def __init__(self, rate:float=0):
+        self.lock = threading.Lock()
+        self.setRate(rate)
+
+    def setRate(self, rate:float) -> None:
+        with self.lock:
+            self.rate = rate
+            self.tokens = rate
+            self.last = time.monotonic()
+        # Biggest piece to copy between take() calls (see copyRange()).
+        self.step = max(64<<10, min(int(rate/10), 1<<30)) if (rate) else 1<<30
+
+    def take(self, n:float) -> None:
+        if (not self.rate): return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate,
+                self.tokens + (now - self.last) * self.rate) - n
+            self.last = now
+            wait = -self.tokens / self.rate if (self.tokens < 0) else 0
+        if (wait > 0): time.sleep(wait)
+
+byteBucket = TokenBucket()
+fileBucket = TokenBucket()
+controlMtime = None
+controlChecked = 0.0
+controlSignalled = False
+
+def noteControlSignal(_sig, _frame) -> None:
+    """SIGUSR1 handler. It only sets a flag: the main thread may be inside
+    a TokenBucket's lock, so calling setRate() here could deadlock.
+    """
+    global controlSignalled
+    controlSignalled = True
+
+def throttleFiles() -> None:
+    """Called (in the main thread) before each copy is started.
+    """
+    global controlChecked, controlSignalled
+    if (controlSignalled):
+        controlSignalled = False
+        controlChecked = time.time()
+        readControlFile(force=True)
+    elif (args.controlFile and time.time() - controlChecked >= 5.0):
+        controlChecked = time.time()
+        readControlFile()
+    fileBucket.take(1)
+
+def readControlFile(force:bool=False) -> None:
+    """Pick up new limits from --controlFile, if it changed (or force).
+    It has lines like "maxBandwidth=20M" and "maxFilesPerSec=100".
+    """
+    global controlMtime
+    try:
+        mtime = os.stat(args.controlFile).st_mtime_ns
+        if (mtime == controlMtime and not force): return
+        controlMtime = mtime
+        with open(args.controlFile) as ifh:
+            lines = ifh.readlines()
+    except OSError as e:
+        warning1("Cannot read control file '%s': %s" % (args.controlFile, e))
+        return
+    for line in lines:
+        line = line.split("#")[0].strip()
+        if (not line): continue
+        name, _eq, value = line.partition("=")
+        name = name.strip()
+        try:
+            if (name == "maxBandwidth"):
+                byteBucket.setRate(parseSize(value))
+            elif (name == "maxFilesPerSec"):
+                fileBucket.setRate(float(value))
+            else:
+                warning0("Unknown setting '%s' in '%s'." % (name, args.controlFile))
+                continue
+        except ValueError:
+            warning0("Bad value for %s in '%s': '%s'." %
+                (name, args.controlFile, value.strip()))
+            continue
+        warning1("Throttle: %s set to %s." % (name, value.strip()))
+
+def parseSize(s:str) -> int:
+    """Parse a byte count with an optional K, M, G, or T (powers of 1024).
+    """
+    s = s.strip().upper().rstrip("B").rstrip("I")
+    mult = 1
+    if (s and s[-1] in "KMGT"):
+        mult = 1024 ** ("KMGT".index(s[-1]) + 1)
+        s = s[:-1]
+    return int(float(s) * mult)
+
+def setIdleIoPriority() -> None:
+    """Put this process in the idle I/O scheduling class (Linux), so it
+    only gets disk time nobody else wants. Threads started later inherit it.
+    """
+    ionice = shutil.which("ionice")
+    if (not ionice):
+        warning0("--ioIdle: 'ionice' not found, I/O priority unchanged.")
+        return
+    try:
+        subprocess.run([ ionice, "-c", "3", "-p", str(os.getpid()) ], check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        warning0("--ioIdle: could not set I/O priority: %s" % (e))
+
+###############################################################################
+# Progress and run statistics.
+#
+startTime = time.time()
+copyStartTime = startTime  # Reset after any --prescan
+lastProgress = 0.0
+totalFiles = None  # Set by --prescan
+totalBytes = None
+
+def prescan() -> None:
+    """Walk the same selection once beforehand, to total files and bytes.
+    """
+    global totalFiles, totalBytes
+    nFiles = nBytes = 0
+    with phase("prescan"):
+        pw0 = PowerWalk(args.files, open=False, close=False,
+            encoding=args.iencoding)
+        pw0.applyOptionsFromArgparse(args)
+        for path0, _fh0, what0 in pw0.traverse():
+            if (what0 != PWType.LEAF): continue
+            try:
+                st = os.stat(path0)
+            except OSError:
+                continue
+            nFiles += 1
+            nBytes += st.st_size
+    totalFiles, totalBytes = nFiles, nBytes
+    warning1("Prescan: %d files, %s." % (nFiles, humanBytes(nBytes)))
+
+def showProgress(final:bool=False) -> None:
+    """At most once per --progressInterval, show rates (and with
+    --prescan, totals and an ETA) on stderr.
+    """
+    global lastProgress
+    now = time.time()
+    if (not final and now - lastProgress < args.progressInterval): return
+    lastProgress = now
+    elapsed = max(now - copyStartTime, 1e-6)
+    nFiles, nBytes = counts["files"], counts["bytes"]
+    buf = "%d files, %s" % (nFiles, humanBytes(nBytes))
+    if (totalFiles is not None):
+        buf = "%d/%d files, %s/%s" % (nFiles, totalFiles,
+            humanBytes(nBytes), humanBytes(totalBytes))
+    buf += ", %.1f files/s, %s/s" % (nFiles/elapsed, humanBytes(nBytes/elapsed))
+    if (totalBytes is not None):
+        done = nBytes + counts["skippedBytes"]
+        if (done > 0 and not final):
+            eta = int(elapsed * (totalBytes - done) / done)
+            buf += ", ETA %d:%02d:%02d" % (eta//3600, eta//60%60, eta%60)
+    if (sys.stderr.isatty()):
+        sys.stderr.write("\r" + buf + "\033[K" + ("\n" if (final) else ""))
+    else:
+        sys.stderr.write(buf + "\n")
+
+def humanBytes(n:float) -> str:
+    for unit in [ "B", "KB", "MB", "GB", "TB" ]:
+        if (n < 1000 or unit == "TB"): break
+        n /= 1000.0
+    return ("%d %s" if (unit == "B") else "%.1f %s") % (n, unit)
+
+def writeStats(path:str) -> None:
+    """Write a JSON record of the run, with time broken down by phase.
+    """
+    rec = {
+        "files": counts["files"],
+        "bytes": counts["bytes"],
+        "elapsed": time.time() - startTime,
+        "jobs": args.jobs,
+        "copyMethod": args.copyMethod,
+        "phases": dict(phaseTimes),
+        "counts": dict(counts),
+    }
+    if (totalFiles is not None):
+        rec["totalFiles"] = totalFiles
+        rec["totalBytes"] = totalBytes
+    if (path == "-"):
+        print(json.dumps(rec, indent=2, sort_keys=True))
+    else:
+        with open(path, "w") as ofh:
+            json.dump(rec, ofh, indent=2, sort_keys=True)
+            ofh.write("\n")
+
 ###############################################################################
 # TODO: At depth>0, shouldn't need to worry about name conflicts.
 #
 def doOneFile(ipath:str, opath:str, depth:int=0) -> str:
     """Read and deal with one individual file.
     """
-    if (os.path.islink(ipath)):                         # LINKS
-        if (args.followLinks or
-            (args.topLevelLinks and depth==0)):
-            ipath = os.path.realpath(ipath)
+    name = os.path.basename(ipath.rstrip("/")) or ipath
+    with phase("stat"):
+        if (os.path.islink(ipath)):                     # LINKS
+            if (args.followLinks or
+                (args.topLevelLinks and depth==0)):
+                ipath = os.path.realpath(ipath)
+        isDir = os.path.isdir(ipath)
 
-    if (os.path.isdir(ipath)):                          # DIRECTORY
+    if (isDir):                                         # DIRECTORY
         if (not args.recursive):
             global nDirsSkipped
             nDirsSkipped += 1
             return
-        for ch in os.listdir(ipath):
-            doOneFile(os.path.join(ipath, ch), os.path.join(opath, ch), depth=depth+1)
+        walkTree(ipath, os.path.join(opath, name), depth=depth)
         return
+    return doLeaf(ipath, opath)
+
+def walkTree(ipath:str, opath:str, depth:int=0) -> None:
+    """Copy directory ipath to (a new or existing) directory opath,
+    depth-first in name order. This uses an explicit stack rather than
+    recursion, so depth is not limited, and takes file types from
+    os.scandir() so most entries need no stat.
+    Symlinks to directories are only followed with --followLinks, and
+    then (dev, inode) of each directory is remembered to avoid loops.
+    """
+    global nDirsSkipped
+    visited = set()
+    stack = [ (ipath, opath, depth) ]
+    while (stack):
+        sdir, tdir, d = stack.pop()
+        if (args.followLinks):
+            with phase("stat"):
+                st = os.stat(sdir)
+            if ((st.st_dev, st.st_ino) in visited):
+                warning0("Skipping '%s': directory loop via symlink." % (sdir))
+                nDirsSkipped += 1
+                continue
+            visited.add((st.st_dev, st.st_ino))
+        if (args.metadataOnly):
+            if (not os.path.isdir(tdir)):
+                warning1("No target directory for '%s'." % (sdir))
+                tally("metaMissing")
+                continue
+            syncMetadata(sdir, tdir)
+        elif (not planFile and not os.path.isdir(tdir)):
+            os.makedirs(tdir, exist_ok=True)
+            claimName(tdir)
+        subdirs = []
+        with phase("walk"):
+            try:
+                with os.scandir(sdir) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                error("Cannot read directory '%s': %s" % (sdir, e))
+                continue
+        for entry in entries:
+            with phase("stat"):
+                isDir = entry.is_dir(follow_symlinks=args.followLinks)
+                isLinkedDir = (not isDir and entry.is_symlink() and
+                    entry.is_dir(follow_symlinks=True))
+                isSpecial = (not isDir and not isLinkedDir and
+                    not entry.is_file(follow_symlinks=True))
+            if (isDir):
+                subdirs.append((entry.path, os.path.join(tdir, entry.name), d+1))
+            elif (isLinkedDir):
+                warning1("Not following symlink to directory '%s'." % (entry.path))
+                nDirsSkipped += 1
+            elif (isSpecial):
+                warning0("Skipping '%s': not a regular file." % (entry.path))
+                tally("specialsSkipped")
+            else:
+                tally("walkedFiles")
+                doLeaf(entry.path, tdir)
+        stack.extend(reversed(subdirs))
+
+def doLeaf(ipath:str, opath:str) -> str:
+    """Copy (or plan, or link) one non-directory ipath into directory opath.
+    """
+    if (args.metadataOnly):
+        return syncLeaf(ipath, opath)
+    with phase("conflict"):
+        action, cand, reason = resolveTarget(ipath, opath)
+    linkFrom = None
+    if (action != "skip" and (args.hardLinks or args.dedupe)):
+        linkFrom = findLinkSource(ipath, cand)
+    if (planFile):
+        writePlanEntry(ipath, cand, action, reason, linkFrom)
+        if (action != "skip"): claimName(cand)
+        return cand
+    if (action == "skip"):
+        if (args.prescan): tally("skippedBytes", os.path.getsize(ipath))
+        return None
+    return dispatchCopy(ipath, cand, overwrite=(action == "overwrite"),
+        linkFrom=linkFrom)
 
+def resolveTarget(ipath:str, opath:str) -> (str, str, str):
+    """Decide where ipath should go in target directory opath.
+    Returns an action ("copy", "overwrite", "rename", or "skip"), the full
+    target path (for "skip", the one that was in the way, if any), and a
+    short reason.
+    """
     _dirpath, basename = os.path.split(ipath)
 
     cand = os.path.join(opath, basename)
-    if (not os.path.exists(cand)):                      # NO CONFLICT
-        return doTheCopy(ipath, cand)
-    if (args.nooverwrite):                              # CONFLICT
-        return None
-    if (args.force or (args.newer and isNewer(ipath, cand))):
-        return doTheCopy(ipath, cand)
+    if (not targetExists(cand)):                        # NO CONFLICT
+        return "copy", cand, "new"
+    if (args.noOverwrite):                              # CONFLICT
+        return "skip", cand, "noOverwrite"
+    while (cand in reserved):                           # Queued this run
+        finishOldest()
+    if (digestCache and isIdentical(ipath, cand)):     # SAME CONTENT
+        tally("identical")
+        warning2("Skipping '%s', identical to '%s'." % (ipath, cand))
+        return "skip", cand, "identical"
+    if (args.force):
+        return "overwrite", cand, "force"
+    if (args.newer and isNewer(ipath, cand)):
+        return "overwrite", cand, "newer"
     if (args.inquire):
         print("overwrite %s? (y/n [n])" % (cand), end="")
         buf = sys.stdin.readline()
         if (buf.startswith("y") or buf.startswith("Y")):
-            return doTheCopy(ipath, cand)
+            return "overwrite", cand, "inquire"
 
-        return None
+        return "skip", cand, "declined"
 
     cand = pulls(ipath, opath, args.maxPulls)     # RENAME TO FIX CONFLICT
     if (cand):
-        return doTheCopy(ipath, cand)
+        return "rename", cand, "pulls"
 
     cand = serials(ipath, opath)
     if (cand):
-        return doTheCopy(ipath, cand)
+        return "rename", cand, "serial"
 
     raise IOError("Can't find a place to put '%s' in '%s'." % (ipath, opath))
 
+###############################################################################
+# Metadata-only sync (--metadataOnly). Existing targets get the source's
+# owner, mode, times, and extended attributes, from stat and xattr calls
+# alone; no file data is read or written. Missing targets are only
+# reported, and ones whose type or size differs are left alone.
+#
+def syncLeaf(ipath:str, opath:str) -> str:
+    cand = os.path.join(opath, os.path.basename(ipath))
+    if (not targetExists(cand)):
+        warning1("No target for '%s' (--metadataOnly does not copy)." % (ipath))
+        tally("metaMissing")
+        return None
+    syncMetadata(ipath, cand)
+    return cand
+
+def syncMetadata(ipath:str, opath:str) -> list:
+    """Make opath's metadata match ipath's, changing only what differs.
+    If both are symlinks, the links themselves are compared (and their
+    mode is left alone, since Linux cannot change it).
+    Returns the kinds of metadata changed ("xattr", "owner", "mode", "times").
+    """
+    with phase("stat"):
+        follow = not (os.path.islink(ipath) and os.path.islink(opath))
+        ist = os.stat(ipath, follow_symlinks=follow)
+        ost = os.stat(opath, follow_symlinks=follow)
+    tally("metaChecked")
+    if (stat.S_IFMT(ist.st_mode) != stat.S_IFMT(ost.st_mode) or
+        (stat.S_ISREG(ist.st_mode) and ist.st_size != ost.st_size)):
+        warning0("Not syncing '%s': type or size differs from '%s'." %
+            (opath, ipath))
+        tally("metaContentDiffers")
+        return []
+
+    changed = []
+    with phase("metadata"):
+        if (syncXattrs(ipath, opath, follow)):
+            changed.append("xattr")
+        if ((ist.st_uid, ist.st_gid) != (ost.st_uid, ost.st_gid)):
+            try:
+                os.chown(opath, ist.st_uid, ist.st_gid, follow_symlinks=follow)
+                changed.append("owner")
+            except PermissionError as e:
+                warning1("Cannot chown '%s': %s" % (opath, e))
+                tally("metaFailed")
+        # After chown, which may have cleared setuid/setgid bits.
+        if (follow and (stat.S_IMODE(ist.st_mode) != stat.S_IMODE(ost.st_mode)
+            or "owner" in changed)):
+            os.chmod(opath, stat.S_IMODE(ist.st_mode))
+            if (stat.S_IMODE(ist.st_mode) != stat.S_IMODE(ost.st_mode)):
+                changed.append("mode")
+        if (ist.st_mtime_ns != ost.st_mtime_ns):
+            os.utime(opath, ns=(ist.st_atime_ns, ist.st_mtime_ns),
+                follow_symlinks=follow)
+            changed.append("times")
+    for kind in changed: tally("meta:" + kind)
+    if (changed and args.verbose):
+        print("%s -> %s (%s)" % (ipath, opath, ", ".join(changed)))
+    if (args.progress): showProgress()
+    return changed
+
+def syncXattrs(ipath:str, opath:str, follow:bool=True) -> bool:
+    """Set any extended attributes of ipath that opath lacks or has with
+    a different value. Like copyXattrs(), this never removes attributes.
+    Returns whether anything was set.
+    """
+    if (not hasattr(os, "listxattr")): return False
+    try:
+        inames = os.listxattr(ipath, follow_symlinks=follow)
+        if (not inames): return False
+        onames = set(os.listxattr(opath, follow_symlinks=follow))
+    except OSError as e:
+        if (e.errno in fallbackErrnos): return False
+        raise
+    changed = False
+    for name in inames:
+        try:
+            value = os.getxattr(ipath, name, follow_symlinks=follow)
+            if (name in onames and
+                os.getxattr(opath, name, follow_symlinks=follow) == value):
+                continue
+            os.setxattr(opath, name, value, follow_symlinks=follow)
+            changed = True
+        except OSError as e:
+            if (e.errno not in [ errno.EPERM, errno.ENOTSUP, errno.ENODATA,
+                errno.EINVAL ]): raise
+    return changed
+
+###############################################################################
+# Hard links and deduplication. Sources that are hard links to the same
+# inode get hard-linked at the target too (--hardLinks). With --dedupe,
+# files with the same content are reflinked (or hard-linked) to the first
+# copy. Only files whose size matches an earlier one are ever hashed.
+#
+hardLinkTargets = {}  # (st_dev, st_ino) of source -> first target path
+dedupeBySize = {}     # size -> [ first (source, target) not yet hashed,
+                      #          { digest: target } ]
+
+def findLinkSource(ipath:str, opath:str) -> tuple:
+    """If ipath can be linked to something already copied in this run,
+    return (kind, earlierTarget). Otherwise remember ipath -> opath, in
+    case later files can link to it, and return None.
+    """
+    with phase("stat"):
+        st = os.stat(ipath)
+    if (args.hardLinks and st.st_nlink > 1):
+        key = (st.st_dev, st.st_ino)
+        if (key in hardLinkTargets):
+            return "hardlink", hardLinkTargets[key]
+        hardLinkTargets[key] = opath
+    if (not args.dedupe or st.st_size == 0): return None
+
+    with phase("conflict"):
+        bucket = dedupeBySize.get(st.st_size)
+        if (bucket is None):
+            dedupeBySize[st.st_size] = [ (ipath, opath), {} ]
+            return None
+        if (bucket[0]):
+            ipath0, opath0 = bucket[0]
+            bucket[1].setdefault(contentDigest(ipath0), opath0)
+            bucket[0] = None
+        digest = contentDigest(ipath, st)
+        if (digest in bucket[1]):
+            return args.dedupeKind, bucket[1][digest]
+        bucket[1][digest] = opath
+    return None
+
+def contentDigest(path:str, st:os.stat_result=None) -> str:
+    if (digestCache): return digestCache.getDigest(path, st)
+    return hashFile(path)
+
+def doTheLink(ipath:str, opath:str, overwrite:bool, linkFrom:tuple,
+    waitFor=None) -> str:
+    """Make opath a hard link or reflink to an earlier target, instead of
+    copying ipath. If that earlier copy is still queued, wait for it. If
+    the link cannot be made (say, it crosses filesystems), just copy.
+    """
+    kind, earlier = linkFrom
+    if (waitFor is not None): waitFor.result()
+    size = os.path.getsize(ipath)
+    tpath = partPath(opath)
+    removeQuietly(tpath)
+    try:
+        with phase("copy"):
+            if (kind == "hardlink"):
+                os.link(earlier, tpath)
+            else:
+                with open(earlier, "rb") as ifh, open(tpath, "wb") as ofh:
+                    copyRange(ifh.fileno(), ofh.fileno(), 0, size, "reflink")
+    except OSError as e:
+        removeQuietly(tpath)
+        if (e.errno not in fallbackErrnos and
+            e.errno not in [ errno.EMLINK, errno.EPERM ]): raise
+        warning1("Cannot %s '%s' to '%s' (%s), copying instead." %
+            (kind, opath, earlier, e))
+        return doTheCopy(ipath, opath, overwrite)
+    with phase("metadata"):
+        if (kind != "hardlink"):
+            if (args.preserve): shutil.copystat(ipath, tpath)
+            else: shutil.copymode(ipath, tpath)
+        os.replace(tpath, opath)
+    tally("link:" + kind)
+    tally("savedBytes", size)
+    tally("files")
+    return opath
+
 def isNewer(path1:str, path2:str):
     """Return True iff path1 is noticeably more recently modified than path2.
     "Noticeably" means 2 seconds, due to Windows time precision issues.
@@ -169,39 +890,80 @@ def isNewer(path1:str, path2:str):
     mtime2 = os.path.getmtime(path2)
     return (mtime1 > mtime2+2.000)
 
+def isIdentical(path1:str, path2:str) -> bool:
+    """Return True iff the two files have the same size and digest.
+    """
+    st1 = os.stat(path1)
+    st2 = os.stat(path2)
+    if (st1.st_size != st2.st_size): return False
+    if (st1.st_dev == st2.st_dev and st1.st_ino == st2.st_ino): return True
+    return (digestCache.getDigest(path1, st1) == digestCache.getDigest(path2, st2))
+
 def pulls(ipath:str, opath:str, maxPulls:int=3) -> str:
     """Try adding one ancestor dir name at a time to the basename, hoping for
     uniqueness.
     """
     parts = ipath.split("/")
-    #basename = parts[-1]
-    parts.pop()
+    basename = parts.pop()
     for i in reversed(range(len(parts))):
         maxPulls -= 1
         if (maxPulls < 0): return None
-        obasename = args.separator.join(parts[i:])
+        obasename = args.separator.join(parts[i:] + [ basename ])
         fullpath = os.path.join(opath, obasename)
-        if (not os.path.exists(fullpath)): return fullpath
+        if (not targetExists(fullpath)): return fullpath
     return None
 
 def serials(ipath:str, opath:str) -> str:
-    """Try adding one ancestor dir name at a time to the basename, hoping for
-    uniqueness.
+    """Try adding a serial number to the basename, hoping for uniqueness.
+    Names only get taken during a run, so start after the last one used.
     """
     _dirs, basename = os.path.split(ipath)
-    fmt = "%%s%%s%%%d0d" % (args.width)
-    for i in range(args.maxSerial):
+    fmt = "%%s%%s%%0%dd" % (args.width)
+    for i in range(nextSerial.get((opath, basename), 0), args.maxSerial):
         obasename = fmt % (basename, args.separator, i)
         fullpath = os.path.join(opath, obasename)
-        if (not os.path.exists(fullpath)): return fullpath
+        if (not targetExists(fullpath)):
+            nextSerial[(opath, basename)] = i + 1
+            return fullpath
     return None
 
-def doTheCopy(ipath, opath) -> str:
-    if (args.preserve):
-        shutil.copy2(ipath, opath)  # follow_symlinks=True ??
+def doTheCopy(ipath, opath, overwrite:bool=False) -> str:
+    """Copy the data (and maybe resource fork). This may run in a worker
+    thread, so it must not print progress or touch the conflict state.
+    """
+    with phase("stat"):
+        ist = os.stat(ipath)
+    if (not stat.S_ISREG(ist.st_mode)):
+        # Opening a FIFO would block forever; devices would be read to the end.
+        raise shutil.SpecialFileError("'%s' is not a regular file." % (ipath))
+    verifyState.hasher = hashlib.blake2b() if (args.verify) else None
+    if (ist.st_size < args.smallFiles and useDirFds and
+        not (args.delta and overwrite) and not isSparse(ist)):
+        smallCopy(ipath, opath, ist)
     else:
-        shutil.copy(ipath, opath)  # follow_symlinks=True ??
-    if (args.verbose): print("%s -> %s" % (ipath, opath))
+        with phase("copy"):
+            if (args.delta and overwrite and os.path.isfile(opath)):
+                tpath = opath
+                method = deltaCopy(ipath, opath)
+            else:
+                tpath = partPath(opath)
+                method = copyData(ipath, opath)
+        tally("method:" + method)
+        with phase("metadata"):
+            if (args.preserve):
+                shutil.copystat(ipath, tpath)  # follow_symlinks=True ??
+            else:
+                shutil.copymode(ipath, tpath)  # follow_symlinks=True ??
+            if (tpath != opath):
+                os.replace(tpath, opath)
+                removeQuietly(journalPath(opath))
+    tally("files")
+    tally("bytes", ist.st_size)
+    if (verifyState.hasher):
+        startVerify(ipath, ist, opath, verifyState.hasher.hexdigest())
+        verifyState.hasher = None
+    elif (digestCache):
+        digestCache.copyEntry(ipath, ist, opath)
 
     if (args.resourceForks):
         orpath = os.path.join(opath, ".rsrc")
@@ -218,11 +980,739 @@ def doTheCopy(ipath, opath) -> str:
 
     return opath
 
+###############################################################################
+# Small files. Per-file overhead matters more than bandwidth here, so
+# keep the source and target directories open and work relative to them
+# (openat-style, via dir_fd), and set metadata through the open file
+# descriptors (fchmod, futimens) rather than by path. Each worker thread
+# keeps its own few directory fds, so none gets closed while in use.
+#
+useDirFds = (os.open in os.supports_dir_fd and os.rename in os.supports_dir_fd)
+dirFdCache = threading.local()
+maxDirFds = 32
+
+def dirFd(path:str) -> (int, int):
+    """Return an open fd for directory path, and how many syscalls that took.
+    """
+    fds = getattr(dirFdCache, "fds", None)
+    if (fds is None):
+        fds = dirFdCache.fds = OrderedDict()
+    fd = fds.get(path)
+    if (fd is not None):
+        fds.move_to_end(path)
+        return fd, 0
+    fd = os.open(path or ".", os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    fds[path] = fd
+    if (len(fds) > maxDirFds):
+        _path, oldFd = fds.popitem(last=False)
+        os.close(oldFd)
+        return fd, 2
+    return fd, 1
+
+def smallCopy(ipath:str, opath:str, ist:os.stat_result) -> None:
+    """Copy a small file with as few (and as cheap) syscalls as possible:
+    open both relative to cached directory fds, read and write it in one
+    go, set mode (and with -p, times and xattrs) on the open fd, and
+    rename into place. Counts the syscalls made (including the caller's
+    stat) for the -v summary.
+    """
+    sdir, sname = os.path.split(ipath)
+    tdir, tname = os.path.split(opath)
+    pname = ".%s.cpPP-part" % (tname)
+    hasher = getattr(verifyState, "hasher", None)
+    with phase("copy"):
+        sfd, n1 = dirFd(sdir)
+        tfd, n2 = dirFd(tdir)
+        nCalls = 1 + n1 + n2
+        ifd = os.open(sname, os.O_RDONLY, dir_fd=sfd)
+        try:
+            ofd = os.open(pname, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600,
+                dir_fd=tfd)
+            nCalls += 2
+        except BaseException:
+            os.close(ifd)
+            raise
+    try:
+        try:
+            with phase("copy"):
+                while (True):
+                    buf = os.read(ifd, max(ist.st_size, 1<<16))
+                    nCalls += 1
+                    if (not buf): break
+                    byteBucket.take(len(buf))
+                    if (hasher): hasher.update(buf)
+                    mv = memoryview(buf)
+                    while (mv):
+                        mv = mv[os.write(ofd, mv):]
+                        nCalls += 1
+                    if (len(buf) == ist.st_size): break  # Usual case
+            with phase("metadata"):
+                os.fchmod(ofd, ist.st_mode & 0o7777)
+                nCalls += 1
+                if (args.preserve):
+                    os.utime(ofd, ns=(ist.st_atime_ns, ist.st_mtime_ns))
+                    nCalls += 1 + copyXattrs(ifd, ofd)
+        finally:
+            os.close(ofd)
+            os.close(ifd)
+            nCalls += 2
+        with phase("metadata"):
+            os.rename(pname, tname, src_dir_fd=tfd, dst_dir_fd=tfd)
+            nCalls += 1
+    except BaseException:
+        try:
+            os.unlink(pname, dir_fd=tfd)
+        except OSError:
+            pass
+        raise
+    tally("method:small")
+    tally("smallSyscalls", nCalls)
+    warning2("Small-file copy of '%s': %d syscalls." % (ipath, nCalls))
+
+def copyXattrs(ifd:int, ofd:int) -> int:
+    """Copy extended attributes between open files, like shutil.copystat.
+    Returns the number of syscalls made.
+    """
+    if (not hasattr(os, "listxattr")): return 0
+    try:
+        names = os.listxattr(ifd)
+    except OSError as e:
+        if (e.errno in fallbackErrnos): return 1
+        raise
+    for name in names:
+        try:
+            os.setxattr(ofd, name, os.getxattr(ifd, name))
+        except OSError as e:
+            if (e.errno not in [ errno.EPERM, errno.ENOTSUP, errno.ENODATA,
+                errno.EINVAL ]): raise
+    return 1 + 2*len(names)
+
+###############################################################################
+# Verification. With --verify, copies go through userspace and a digest
+# is taken of the data as it is written. "stream" stops there, so a copy
+# only counts as verified if the digest cache (--skipIdentical) already
+# knew the source's digest; others are counted as unchecked. "reread" (the
+# default) also re-reads each finished target in a separate pool.
+#
+verifyState = threading.local()
+verifyPool = None
+verifyPending = deque()
+verifyReport = None
+
+def hashZeros(n:int) -> None:
+    """Account for a hole of n bytes in the streamed digest.
+    """
+    hasher = getattr(verifyState, "hasher", None)
+    if (not hasher or n <= 0): return
+    zeros = bytes(min(n, 1<<20))
+    while (n > 0):
+        hasher.update(zeros[:n])
+        n -= len(zeros)
+
+def hashPrefix(fd:int, n:int) -> None:
+    """Feed the first n bytes of fd into the streamed digest. When --resume
+    continues an earlier run, fd must be the source, not the target, so
+    that a damaged prefix in the target fails the later reread.
+    """
+    hasher = getattr(verifyState, "hasher", None)
+    offset = 0
+    while (hasher and offset < n):
+        buf = os.pread(fd, min(n-offset, args.bufferSize), offset)
+        if (not buf): break
+        hasher.update(buf)
+        offset += len(buf)
+
+def startVerify(ipath:str, ist:os.stat_result, opath:str, digest:str) -> None:
+    """Check one finished copy, given the digest of the bytes written.
+    """
+    known = None
+    if (digestCache):
+        known = digestCache.lookup(ist)
+        if (known and known != digest):
+            noteMismatch(ipath, opath, known, digest, "source changed")
+            return
+        digestCache.store(ist, digest)
+    if (args.verifyMode == "stream"):
+        tally("verified" if (known) else "verifyUnchecked")
+        if (digestCache): digestCache.store(os.stat(opath), digest)
+        return
+    with statsLock:
+        while (verifyPending and verifyPending[0].done()):
+            verifyPending.popleft().result()
+        verifyPending.append(verifyPool.submit(rereadTarget, ipath, opath, digest))
+
+def rereadTarget(ipath:str, opath:str, digest:str) -> None:
+    """Read back a finished target (from disk, not cache, if the OS lets
+    us say so) and compare its digest to what was written.
+    """
+    with open(opath, "rb") as fh:
+        if (hasattr(os, "posix_fadvise")):
+            os.fsync(fh.fileno())
+            os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        st = os.fstat(fh.fileno())
+    got = hashFile(opath)
+    if (got != digest):
+        noteMismatch(ipath, opath, digest, got, "target differs")
+        return
+    tally("verified")
+    if (digestCache): digestCache.store(st, got)
+
+def noteMismatch(ipath:str, opath:str, expected:str, got:str, why:str) -> None:
+    tally("verifyMismatches")
+    error("Verify failed for '%s' -> '%s': %s." % (ipath, opath, why))
+    with statsLock:
+        verifyReport.write("%s\t%s\t%s\t%s\t%s\n" %
+            (why, ipath, opath, expected, got))
+        verifyReport.flush()
+
+def finishVerify() -> None:
+    while (verifyPending):
+        verifyPending.popleft().result()
+
+###############################################################################
+#
+class DigestCache:
+    """Content digests kept in SQLite across runs, so a file is only read
+    again when its (dev, inode, size, mtime_ns) changes. One row per
+    (dev, inode); rows for files that changed are simply replaced.
+    Safe to use from the worker threads.
+    """
+    def __init__(self, path:str):
+        import sqlite3
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS digests (
+            dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER,
+            digest TEXT, PRIMARY KEY (dev, ino))""")
+        self.nUncommitted = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, st:os.stat_result) -> str:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, digest FROM digests WHERE dev=? AND ino=?",
+                (st.st_dev, st.st_ino)).fetchone()
+        if (row and row[0] == st.st_size and row[1] == st.st_mtime_ns):
+            return row[2]
+        return None
+
+    def store(self, st:os.stat_result, digest:str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, digest))
+            self.nUncommitted += 1
+            if (self.nUncommitted >= 1000):
+                self.conn.commit()
+                self.nUncommitted = 0
+
+    def getDigest(self, path:str, st:os.stat_result=None) -> str:
+        """Return the cached digest for path, reading the file if need be.
+        """
+        if (st is None): st = os.stat(path)
+        digest = self.lookup(st)
+        if (digest):
+            self.hits += 1
+            return digest
+        self.misses += 1
+        digest = hashFile(path)
+        self.store(st, digest)
+        return digest
+
+    def copyEntry(self, ipath:str, ist:os.stat_result, opath:str) -> None:
+        """After copying ipath to opath, give opath the source's digest (if
+        known and the source did not change during the copy).
+        """
+        digest = self.lookup(ist)
+        if (not digest): return
+        st = os.stat(ipath)
+        if (st.st_size != ist.st_size or st.st_mtime_ns != ist.st_mtime_ns):
+            return
+        self.store(os.stat(opath), digest)
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+digestCache = None
+
+def hashFile(path:str) -> str:
+    h = hashlib.blake2b()
+    with open(path, "rb") as fh:
+        while (True):
+            buf = fh.read(args.bufferSize)
+            if (not buf): break
+            h.update(buf)
+    return h.hexdigest()
+
+
+###############################################################################
+# Moving the bytes. copyRange() copies one byte range by a given method;
+# copyData() chooses the method for each (source, target) filesystem pair
+# and falls back down the list when the kernel says no.
+#
+copyMethods = [ "reflink", "copy_file_range", "sendfile", "userspace" ]
+
+FICLONE = 0x40049409        # From linux/fs.h
+FICLONERANGE = 0x4020940D
+
+fallbackErrnos = set([ errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP,
+    errno.ENOTTY, errno.EINVAL, errno.ENOSYS ])
+
+bestMethod = {}  # (source st_dev, target st_dev) -> index into copyMethods
+
+def copyData(ipath:str, opath:str) -> str:
+    """Copy the bytes of ipath into partPath(opath), which doTheCopy() later
+    renames into place. Big files are copied an extent at a time, with a
+    journal so that --resume can continue after an interruption.
+    Returns the name of the copy method that actually did it.
+    """
+    try:
+        ost = os.stat(opath)
+    except FileNotFoundError:
+        ost = None
+    tpath = partPath(opath)
+    with open(ipath, "rb") as ifh:
+        ifd = ifh.fileno()
+        ist = os.fstat(ifd)
+        if (ost and ost.st_dev == ist.st_dev and ost.st_ino == ist.st_ino):
+            raise shutil.SameFileError(
+                "'%s' and '%s' are the same file." % (ipath, opath))
+        sparse = isSparse(ist)
+        nData = 0
+        if (ist.st_size < args.journalThreshold):
+            try:
+                with open(tpath, "wb") as ofh:
+                    ofd = ofh.fileno()
+                    devs = (ist.st_dev, os.fstat(ofd).st_dev)
+                    method, nData = copySpan(
+                        ifd, ofd, 0, ist.st_size, devs, opath, sparse)
+                    if (sparse): os.ftruncate(ofd, ist.st_size)
+            except BaseException:
+                removeQuietly(tpath)
+                raise
+            if (sparse): noteSparse(opath, ist.st_size, nData)
+            return method
+
+        jpath = journalPath(opath)
+        offset = resumePoint(ifd, ist, tpath, jpath) if (args.resume) else 0
+        resumed = offset
+        method = None
+        with open(tpath, "r+b" if (offset) else "wb") as ofh, \
+             open(jpath, "a" if (offset) else "w") as jfh:
+            ofd = ofh.fileno()
+            devs = (ist.st_dev, os.fstat(ofd).st_dev)
+            if (offset):
+                os.ftruncate(ofd, offset)
+                hashPrefix(ifd, offset)
+                tally("resumedBytes", offset)
+                warning1("Resuming '%s' at byte %d." % (opath, offset))
+            else:
+                jfh.write("%d %d %d\n" %
+                    (ist.st_size, ist.st_mtime_ns, args.extentSize))
+            while (offset < ist.st_size):
+                n = min(args.extentSize, ist.st_size - offset)
+                method, nd = copySpan(
+                    ifd, ofd, offset, offset+n, devs, opath, sparse)
+                os.fsync(ofd)
+                jfh.write("%d %d\n" % (offset, n))
+                jfh.flush()
+                offset += n
+                nData += nd
+            if (sparse): os.ftruncate(ofd, ist.st_size)
+    if (sparse): noteSparse(opath, ist.st_size - resumed, nData)
+    return method
+
+def copySpan(ifd:int, ofd:int, start:int, end:int, devs:tuple, opath:str,
+    sparse:bool=False) -> (str, int):
+    """Copy bytes [start:end). If sparse, copy only the parts that hold
+    data, leaving holes in the target. Returns the copy method used and
+    the number of data bytes copied.
+    """
+    if (not sparse):
+        return copyBest(ifd, ofd, start, end-start, devs, opath), end-start
+    method = None
+    nData = 0
+    pos = start
+    for offset, n in dataSegments(ifd, start, end):
+        hashZeros(offset - pos)
+        method = copyBest(ifd, ofd, offset, n, devs, opath)
+        nData += n
+        pos = offset + n
+    hashZeros(end - pos)
+    if (method is None):  # All hole
+        method = copyBest(ifd, ofd, start, 0, devs, opath)
+    return method, nData
+
+def isSparse(st:os.stat_result) -> bool:
+    """Does the file have fewer blocks allocated than its size needs?
+    """
+    if (not hasattr(os, "SEEK_DATA") or not hasattr(st, "st_blocks")):
+        return False
+    return (st.st_blocks * 512 < st.st_size)
+
+def dataSegments(fd:int, start:int, end:int):
+    """Generate (offset, length) for each run of data (not hole) in
+    [start:end), using SEEK_DATA/SEEK_HOLE. If the filesystem cannot
+    tell, the whole range is one segment.
+    """
+    offset = start
+    while (offset < end):
+        try:
+            data = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if (e.errno == errno.ENXIO): return  # Only a hole is left
+            if (e.errno in fallbackErrnos):
+                yield offset, end-offset
+                return
+            raise
+        if (data >= end): return
+        hole = min(os.lseek(fd, data, os.SEEK_HOLE), end)
+        yield data, hole-data
+        offset = hole
+
+def noteSparse(opath:str, size:int, nData:int) -> None:
+    tally("denseBytes", nData)
+    tally("sparseBytes", size - nData)
+    warning1("Sparse copy to '%s': %d data bytes, %d bytes of holes." %
+        (opath, nData, size - nData))
+
+def deltaCopy(ipath:str, opath:str) -> str:
+    """Update an existing target in place, writing only the --blockSize
+    blocks that differ from the source, then truncating to the source size.
+    Both files are local, so blocks at the same offset are compared
+    directly; unchanged stretches cost two reads and no writes.
+    """
+    bsize = args.blockSize
+    chunk = max(bsize, args.bufferSize // bsize * bsize)
+    nLiteral = nMatched = 0
+    hasher = getattr(verifyState, "hasher", None)
+    with open(ipath, "rb") as ifh, open(opath, "r+b") as ofh:
+        ifd, ofd = ifh.fileno(), ofh.fileno()
+        offset = 0
+        while (True):
+            ibuf = os.pread(ifd, chunk, offset)
+            if (not ibuf): break
+            byteBucket.take(len(ibuf))
+            if (hasher): hasher.update(ibuf)
+            obuf = os.pread(ofd, len(ibuf), offset)
+            if (ibuf == obuf):
+                nMatched += len(ibuf)
+            else:
+                for b in range(0, len(ibuf), bsize):
+                    iblock = ibuf[b:b+bsize]
+                    if (iblock == obuf[b:b+bsize]):
+                        nMatched += len(iblock)
+                    else:
+                        writeAt(ofd, iblock, offset+b)
+                        nLiteral += len(iblock)
+            offset += len(ibuf)
+        if (os.fstat(ofd).st_size != offset):
+            os.ftruncate(ofd, offset)
+    tally("deltaLiteral", nLiteral)
+    tally("deltaMatched", nMatched)
+    warning2("Delta for '%s': %d bytes written, %d matched." %
+        (opath, nLiteral, nMatched))
+    return "delta"
+
+def partPath(opath:str) -> str:
+    """Where the data goes until it is complete (same directory, so the
+    final os.replace() is atomic).
+    """
+    dirpath, basename = os.path.split(opath)
+    return os.path.join(dirpath, ".%s.cpPP-part" % (basename))
+
+def journalPath(opath:str) -> str:
+    dirpath, basename = os.path.split(opath)
+    return os.path.join(dirpath, ".%s.cpPP-journal" % (basename))
+
+def resumePoint(ifd:int, ist:os.stat_result, tpath:str, jpath:str) -> int:
+    """Read the journal of an interrupted copy. If it is for this same
+    source (size, mtime_ns, and extent size), return the end of the last
+    extent whose data in tpath still matches the source. Else 0.
+    The journal is "size mtime_ns extentSize", then one "offset length"
+    line per extent that was written and fsynced.
+    """
+    try:
+        with open(jpath) as jfh:
+            lines = jfh.read().splitlines()
+    except (FileNotFoundError, UnicodeDecodeError):
+        return 0
+    try:
+        header = [ int(x) for x in lines[0].split() ]
+        extents = [ tuple(int(x) for x in line.split()) for line in lines[1:]
+            if (len(line.split()) == 2) ]
+    except (IndexError, ValueError):
+        return 0
+    if (header != [ ist.st_size, ist.st_mtime_ns, args.extentSize ]):
+        return 0
+
+    done = []  # Only the contiguous prefix counts
+    for offset, n in extents:
+        if (offset != (done[-1][0] + done[-1][1] if (done) else 0)): break
+        done.append((offset, n))
+    try:
+        tfd = os.open(tpath, os.O_RDONLY)
+    except FileNotFoundError:
+        return 0
+    try:
+        while (done):
+            offset, n = done[-1]
+            if (sameBytes(ifd, tfd, offset, n)): return offset + n
+            warning1("Extent at %d of '%s' does not verify." % (offset, tpath))
+            done.pop()
+    finally:
+        os.close(tfd)
+    return 0
+
+def sameBytes(fd1:int, fd2:int, offset:int, length:int) -> bool:
+    end = offset + length
+    while (offset < end):
+        n = min(end - offset, args.bufferSize)
+        buf = os.pread(fd1, n, offset)
+        if (not buf or buf != os.pread(fd2, n, offset)): return False
+        offset += len(buf)
+    return True
+
+def removeQuietly(path:str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def copyBest(ifd:int, ofd:int, offset:int, length:int, devs:tuple,
+    opath:str) -> str:
+    """Copy a range with the first copy method that works, starting with
+    the one that last worked for this pair of devices (or --copyMethod).
+    """
+    if (length > args.bufferSize and (args.pipeline == "always" or
+        (args.pipeline == "crossdev" and devs[0] != devs[1]))):
+        pipelineCopy(ifd, ofd, offset, length)
+        return "pipeline"
+    if (getattr(verifyState, "hasher", None)):
+        first = copyMethods.index("userspace")  # Data must pass through us
+    elif (args.copyMethod == "auto"):
+        first = bestMethod.get(devs, 0)
+    else:
+        first = copyMethods.index(args.copyMethod)
+    for i in range(first, len(copyMethods)):
+        method = copyMethods[i]
+        try:
+            copyRange(ifd, ofd, offset, length, method)
+        except OSError as e:
+            if (e.errno not in fallbackErrnos or
+                i == len(copyMethods)-1): raise
+            warning2("%s failed for '%s' (%s), falling back." %
+                (method, opath, e))
+            os.ftruncate(ofd, offset)
+            continue
+        bestMethod[devs] = i
+        return method
+    return None
+
+def copyRange(ifd:int, ofd:int, offset:int, length:int, method:str) -> None:
+    """Copy 'length' bytes at 'offset' in ifd, to the same offset in ofd.
+    Stops early at end of file. Unavailable methods raise OSError(ENOSYS).
+    """
+    end = offset + length
+    if (method == "reflink"):
+        if (fcntl is None):
+            raise OSError(errno.ENOSYS, "No fcntl module")
+        if (offset == 0 and length >= os.fstat(ifd).st_size):
+            fcntl.ioctl(ofd, FICLONE, ifd)
+        else:
+            fcntl.ioctl(ofd, FICLONERANGE,
+                struct.pack("qQQQ", ifd, offset, length, offset))
+    elif (method == "copy_file_range"):
+        if (not hasattr(os, "copy_file_range")):
+            raise OSError(errno.ENOSYS, "No os.copy_file_range")
+        while (offset < end):
+            n = os.copy_file_range(ifd, ofd, min(end-offset, byteBucket.step),
+                offset, offset)
+            if (n == 0):
+                checkStoppedShort(ifd, offset, method)
+                break
+            byteBucket.take(n)
+            offset += n
+    elif (method == "sendfile"):
+        if (not hasattr(os, "sendfile")):
+            raise OSError(errno.ENOSYS, "No os.sendfile")
+        os.lseek(ofd, offset, os.SEEK_SET)
+        while (offset < end):
+            n = os.sendfile(ofd, ifd, offset, min(end-offset, byteBucket.step))
+            if (n == 0):
+                checkStoppedShort(ifd, offset, method)
+                break
+            byteBucket.take(n)
+            offset += n
+    elif (method == "userspace"):
+        hasher = getattr(verifyState, "hasher", None)
+        while (offset < end):
+            buf = os.pread(ifd, min(end-offset, args.bufferSize), offset)
+            if (not buf): break
+            byteBucket.take(len(buf))
+            writeAt(ofd, buf, offset)
+            if (hasher): hasher.update(buf)
+            offset += len(buf)
+    else:
+        raise ValueError("Unknown copy method '%s'." % (method))
+
+def checkStoppedShort(ifd:int, offset:int, method:str) -> None:
+    """A kernel copy returned 0 at offset. That is only end of file if the
+    source really ends there; some pseudo and network filesystems return 0
+    for files with data. Raise EINVAL so copyBest() falls back.
+    """
+    size = os.fstat(ifd).st_size
+    if (offset < size):
+        raise OSError(errno.EINVAL, "%s stopped at %d of %d bytes" %
+            (method, offset, size))
+
+###############################################################################
+# Overlapped copying. A reader thread fills buffers while the calling
+# thread writes out the previous ones, so both devices stay busy.
+#
+class BufferTuner:
+    """Choose the read size for pipelineCopy(): keep doubling it while
+    that raises throughput, and halve it if throughput drops off.
+    """
+    def __init__(self, size:int, maxSize:int):
+        self.minSize = size
+        self.maxSize = max(size, maxSize)
+        self.size = size
+        self.bestRate = 0.0
+        self.nBytes = 0
+        self.t0 = time.monotonic()
+
+    def record(self, n:int) -> None:
+        """Note n more bytes written; re-decide every few buffers' worth.
+        """
+        self.nBytes += n
+        if (self.nBytes < 4 * self.size): return
+        now = time.monotonic()
+        rate = self.nBytes / max(now - self.t0, 1e-9)
+        if (rate > self.bestRate * 1.05):
+            self.bestRate = rate
+            self.size = min(self.size * 2, self.maxSize)
+        elif (rate < self.bestRate * 0.8):
+            self.bestRate = rate
+            self.size = max(self.size // 2, self.minSize)
+        self.nBytes = 0
+        self.t0 = now
+
+def pipelineCopy(ifd:int, ofd:int, offset:int, length:int) -> None:
+    """Copy a range with reads and writes overlapped, using a pool of
+    --pipelineDepth buffers whose size adapts to measured throughput.
+    """
+    end = offset + length
+    tuner = BufferTuner(args.bufferSize, args.maxBufferSize)
+    free = queue.Queue()
+    filled = queue.Queue()
+    for _i in range(args.pipelineDepth): free.put(bytearray(0))
+    errors = []
+
+    def reader():
+        pos = offset
+        try:
+            while (pos < end):
+                buf = free.get()
+                if (buf is None): return  # Writer gave up
+                size = min(tuner.size, end - pos)
+                if (len(buf) < size): buf = bytearray(tuner.size)
+                if (hasattr(os, "preadv")):
+                    n = os.preadv(ifd, [ memoryview(buf)[:size] ], pos)
+                else:
+                    data = os.pread(ifd, size, pos)
+                    n = len(data)
+                    buf[:n] = data
+                if (n == 0): break
+                filled.put((pos, buf, n))
+                pos += n
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            filled.put(None)
+
+    hasher = getattr(verifyState, "hasher", None)
+    th = threading.Thread(target=reader, daemon=True)
+    th.start()
+    try:
+        while (True):
+            item = filled.get()
+            if (item is None): break
+            pos, buf, n = item
+            view = memoryview(buf)[:n]
+            byteBucket.take(n)
+            writeAt(ofd, view, pos)
+            if (hasher): hasher.update(view)
+            tuner.record(n)
+            free.put(buf)
+    finally:
+        free.put(None)
+        th.join()
+    if (errors): raise errors[0]
+
+def writeAt(ofd:int, buf:bytes, offset:int) -> None:
+    """Write all of buf at offset (os.pwrite may write only part).
+    """
+    mv = memoryview(buf)
+    while (mv):
+        n = os.pwrite(ofd, mv, offset)
+        mv = mv[n:]
+        offset += n
+
+def summarize() -> str:
+    methods = [ "%s %d" % (k[7:], v) for k, v in sorted(counts.items())
+        if k.startswith("method:") ]
+    buf = "cpPP.py: Done, %d files." % (counts["walkedFiles"] +
+        (pw.getStat("regular") if (pw) else counts["files"]))
+    if (methods): buf += " Copy methods: %s." % (", ".join(methods))
+    if (counts["identical"]):
+        buf += " Skipped %d identical." % (counts["identical"])
+    if (counts["specialsSkipped"]):
+        buf += " Skipped %d special files." % (counts["specialsSkipped"])
+    if (counts["method:delta"]):
+        buf += " Delta: %d bytes written, %d matched." % (
+            counts["deltaLiteral"], counts["deltaMatched"])
+    links = [ "%s %d" % (k[5:], v) for k, v in sorted(counts.items())
+        if k.startswith("link:") ]
+    if (links):
+        buf += " Links: %s, saving %s." % (
+            ", ".join(links), humanBytes(counts["savedBytes"]))
+    if (args.metadataOnly):
+        fixed = [ "%s %d" % (k[5:], v) for k, v in sorted(counts.items())
+            if k.startswith("meta:") ]
+        buf += " Metadata: checked %d, fixed %s." % (
+            counts["metaChecked"], ", ".join(fixed) or "none")
+        if (counts["metaMissing"] or counts["metaContentDiffers"]):
+            buf += " %d missing at target, %d differing in type or size." % (
+                counts["metaMissing"], counts["metaContentDiffers"])
+    if (args.verify):
+        buf += " Verified %d, %d mismatches." % (
+            counts["verified"], counts["verifyMismatches"])
+        if (counts["verifyUnchecked"]):
+            buf += " %d unchecked (no known source digest)." % (
+                counts["verifyUnchecked"])
+    if (counts["method:small"] and args.verbose):
+        buf += " Small-file path: %.1f syscalls/file." % (
+            counts["smallSyscalls"] / counts["method:small"])
+    if (counts["sparseBytes"] and args.verbose):
+        buf += " Sparse files: %d data bytes, %d bytes of holes." % (
+            counts["denseBytes"], counts["sparseBytes"])
+    if (counts["resumedBytes"]):
+        buf += " Resumed past %d bytes." % (counts["resumedBytes"])
+    if (digestCache and args.verbose):
+        buf += " Digest cache: %d hits, %d misses." % (
+            digestCache.hits, digestCache.misses)
+    return buf
+
+
 ###############################################################################
 # Main
 #
 if __name__ == "__main__":
-    import argparse
     def anyInt(x:str) -> int:
         return int(x, 0)
 
@@ -237,6 +1727,35 @@ if __name__ == "__main__":
         parser.add_argument(
             "-a", action="store_true",
             help="Shorthand for -p -P -R -s.")
+        parser.add_argument(
+            "--blockSize", "--block-size", type=parseSize, default=64<<10, metavar="N",
+            help="Block size for --delta comparisons. Default: 64KiB.")
+        parser.add_argument(
+            "--bufferSize", "--buffer-size", type=parseSize, default=1<<20, metavar="N",
+            help="Buffer size for userspace copying. Default: 1MiB.")
+        parser.add_argument(
+            "--copyMethod", "--copy-method", type=str, default="auto",
+            choices=[ "auto" ] + copyMethods,
+            help="How to move the data (see Copy methods, above). Default: auto.")
+        parser.add_argument(
+            "--delta", action="store_true",
+            help="Overwrite existing targets in place, writing only changed blocks.")
+        parser.add_argument(
+            "--controlFile", "--control-file", type=str, metavar="PATH",
+            help="Read throttling limits from PATH, also when it changes or on SIGUSR1.")
+        parser.add_argument(
+            "--dedupe", action="store_true",
+            help="Link files whose content was already copied, instead of copying.")
+        parser.add_argument(
+            "--dedupeKind", "--dedupe-kind", type=str, default="reflink",
+            choices=[ "reflink", "hardlink" ],
+            help="With --dedupe, what kind of link to make. Default: reflink.")
+        parser.add_argument(
+            "--executePlan", "--execute-plan", type=str, metavar="PATH",
+            help="Carry out a plan saved by --plan (see also --shard).")
+        parser.add_argument(
+            "--extentSize", "--extent-size", type=parseSize, default=64<<20, metavar="N",
+            help="Journal big copies in extents of N bytes. Default: 64MiB.")
         parser.add_argument(
             "--followLinks", "--follow-links", "-L", action="store_true",
             help="Follow symbolic links.")
@@ -246,12 +1765,45 @@ if __name__ == "__main__":
         #parser.add_argument(
         #    "--ignoreCase", "--ignore-case", aaction="store_true",
         #    help="Disregard case distinctions.")
+        parser.add_argument(
+            "--hardLinks", "--hard-links", action="store_true",
+            help="Recreate hard links among source files at the target.")
+        parser.add_argument(
+            "--hashCache", "--hash-cache", type=str, metavar="PATH",
+            default=os.path.join(os.environ.get("XDG_CACHE_HOME",
+                os.path.expanduser("~/.cache")), "cpPP-digests.sqlite"),
+            help="SQLite file of content digests for --skipIdentical.")
         parser.add_argument(
             "--inquire", "-i", action="store_true",
             help="Ask user before copying, when the output file already exists.")
+        parser.add_argument(
+            "--ioIdle", "--io-idle", action="store_true",
+            help="Use the idle I/O scheduling class (Linux 'ionice -c 3').")
+        parser.add_argument(
+            "--jobs", "-j", type=int, default=1, metavar="N",
+            help="Run up to N copies at once in worker threads.")
+        parser.add_argument(
+            "--journalThreshold", "--journal-threshold", type=parseSize,
+            default=256<<20, metavar="N",
+            help="Journal copies of files of at least N bytes. Default: 256MiB.")
+        parser.add_argument(
+            "--maxBandwidth", "--max-bandwidth", type=parseSize, default=0,
+            metavar="N", help="Copy at most about N bytes/second (K, M, G suffixes ok).")
+        parser.add_argument(
+            "--maxBufferSize", "--max-buffer-size", type=parseSize, default=64<<20,
+            metavar="N", help="Largest buffer --pipeline may grow to. Default: 64MiB.")
+        parser.add_argument(
+            "--maxFilesPerSec", "--max-files-per-sec", type=float, default=0,
+            metavar="N", help="Start at most about N copies per second.")
         parser.add_argument(
             "--maxPulls", "--max-pulls", type=int, default=0, metavar="N",
             help="Pull up to N ancestor directory names into the filename to uniqify.")
+        parser.add_argument(
+            "--maxSerial", "--max-serial", type=int, default=10000, metavar="N",
+            help="Try up to N serial-number suffixes to uniqify.")
+        parser.add_argument(
+            "--metadataOnly", "--metadata-only", action="store_true",
+            help="Don't copy data; just fix owner, mode, times, and xattrs of existing targets.")
         parser.add_argument(
             "--newer", action="store_true",
             help="Overwrite a like-named file at the target, if replacement is newer.")
@@ -264,6 +1816,28 @@ if __name__ == "__main__":
         parser.add_argument(
             "--preserve", "-p", action="store_true",
             help="Preserve file attributes. See also --resourceForks.")
+        parser.add_argument(
+            "--pipeline", type=str, default="never",
+            choices=[ "never", "crossdev", "always" ],
+            help="Overlap reads and writes, for copies between devices, or always.")
+        parser.add_argument(
+            "--pipelineDepth", "--pipeline-depth", type=int, default=4, metavar="N",
+            help="Number of buffers for --pipeline. Default: 4.")
+        parser.add_argument(
+            "--plan", type=str, metavar="PATH",
+            help="Don't copy; write what would be done as JSONL to PATH ('-' for stdout).")
+        parser.add_argument(
+            "--prescan", action="store_true",
+            help="Total up files and bytes first, for --progress ETA.")
+        parser.add_argument(
+            "--progress", action="store_true",
+            help="Show files/s, MB/s (and with --prescan, ETA) as copying goes.")
+        parser.add_argument(
+            "--progressInterval", "--progress-interval", type=float, default=1.0,
+            metavar="S", help="Update --progress at most every S seconds.")
+        parser.add_argument(
+            "--queueDepth", "--queue-depth", type=int, default=0, metavar="N",
+            help="With --jobs, allow at most N copies queued (default: 4*jobs).")
         parser.add_argument(
             "--quiet", "-q", action="store_true",
             help="Suppress most messages.")
@@ -273,15 +1847,44 @@ if __name__ == "__main__":
         parser.add_argument(
             "--resourceForks", "--resource-forks", action="store_true",
             help="Cheeck for Mac resource forks and copy them to separate .rsrc files.")
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="Continue interrupted copies of big files from their journals.")
         parser.add_argument(
             "--separator", type=str, default="_",
             help="Put this between basename and affix(es).")
+        parser.add_argument(
+            "--shard", type=parseShard, metavar="K/N",
+            help="With --executePlan, do only the Kth of N parts of the plan.")
+        parser.add_argument(
+            "--skipIdentical", "--skip-identical", action="store_true",
+            help="Don't copy (or rename) when the target has the same content.")
+        parser.add_argument(
+            "--smallFiles", "--small-files", type=parseSize, default=0, metavar="N",
+            help="Use the quicker small-file path for files under N bytes.")
+        parser.add_argument(
+            "--statsJson", "--stats-json", type=str, metavar="PATH",
+            help="Write run statistics as JSON to PATH ('-' for stdout).")
         parser.add_argument(
             "--topLevelLinks", "--top-level-links", "-H", action="store_true",
             help="Follow symbolic links, but only at the top level.")
         parser.add_argument(
             "--verbose", "-v", action="count", default=0,
             help="Add more messages (repeatable).")
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="Check copies (see --verifyMode).")
+        parser.add_argument(
+            "--verifyJobs", "--verify-jobs", type=int, default=0, metavar="N",
+            help="Threads for --verifyMode reread. Default: same as --jobs.")
+        parser.add_argument(
+            "--verifyMode", "--verify-mode", type=str, default="reread",
+            choices=[ "reread", "stream" ],
+            help="How --verify checks: re-read each target, or only compare the "
+            "written data to the digest cache. Default: reread.")
+        parser.add_argument(
+            "--verifyReport", "--verify-report", type=str, metavar="PATH",
+            help="Write --verify mismatches to PATH (default: stderr).")
         parser.add_argument(
             "--version", action="version", version=__version__,
             help="Display version information, then exit.")
@@ -296,31 +1899,90 @@ if __name__ == "__main__":
             help="Path(s) to input file(s)")
 
         args0 = parser.parse_args()
-        if (args0.R):
-            args0.recursive = True  # Let PowerWalk know
         if (args0.a):
             args0.preserve = args0.noLinks = args0.recursive = True
-        if (args.noLinks):
+        if (args0.noLinks):
             args0.followLinks = args0.topLevelLinks = False
-        if (args.resourceForks and rsrcfork is None):
-            fatal("--resourceForks requested, but pip rsrcfork library not available.")
-        if (args.force and args.newer):
-            fatal("--force and --newer both specified. Please pick just one of them.")
+        if (args0.resourceForks and rsrcfork is None):
+            parser.error("--resourceForks requested, but pip rsrcfork library not available.")
+        if (args0.force and args0.newer):
+            parser.error("--force and --newer both specified. Please pick just one of them.")
+        if (args0.jobs < 1):
+            parser.error("--jobs must be at least 1.")
+        if (args0.pipelineDepth < 2):
+            parser.error("--pipelineDepth must be at least 2.")
+        if (args0.metadataOnly and (args0.plan or args0.executePlan)):
+            parser.error("--metadataOnly cannot be used with --plan or --executePlan.")
+        if (args0.verifyJobs < 1):
+            args0.verifyJobs = args0.jobs
+        if (args0.blockSize < 1):
+            parser.error("--blockSize must be positive.")
+        if (args0.extentSize < 1):
+            parser.error("--extentSize must be positive.")
+        if (args0.queueDepth < 1):
+            args0.queueDepth = 4 * args0.jobs
+        if (not getattr(args0, "tgtDir", None) and len(args0.files) > 1):
+            args0.tgtDir = args0.files.pop()
+        if (not args0.executePlan):
+            if (len(args0.files) == 0):
+                parser.error("No files specified.")
+            if (not getattr(args0, "tgtDir", None)):
+                parser.error("No target directory specified (it goes last).")
         return(args0)
 
     ###########################################################################
     #
     args = processOptions()
 
-    if (len(args.files) == 0):
-        fatal("cpPP.py: No files specified....")
+    byteBucket.setRate(args.maxBandwidth)
+    fileBucket.setRate(args.maxFilesPerSec)
+    if (args.controlFile):
+        readControlFile()
+        if (hasattr(signal, "SIGUSR1")):
+            signal.signal(signal.SIGUSR1, noteControlSignal)
+    if (args.ioIdle): setIdleIoPriority()
+
+    if (args.jobs > 1):
+        pool = ThreadPoolExecutor(max_workers=args.jobs)
+    if (args.skipIdentical):
+        os.makedirs(os.path.dirname(args.hashCache) or ".", exist_ok=True)
+        digestCache = DigestCache(args.hashCache)
+    if (args.verify):
+        verifyReport = open(args.verifyReport, "w") if (args.verifyReport) \
+            else sys.stderr
+        if (args.verifyMode == "reread"):
+            verifyPool = ThreadPoolExecutor(max_workers=args.verifyJobs)
+
+    if (args.plan):
+        planFile = sys.stdout if (args.plan == "-") else open(args.plan, "w")
+    if (args.prescan and not args.executePlan): prescan()
+    copyStartTime = time.time()
 
-    pw = PowerWalk(args.files, open=False, close=False,
-        encoding=args.iencoding)
-    pw.applyOptionsFromArgparse(args)
-    for path0, fh0, what0 in pw.traverse():
-        if (what0 != PWType.LEAF): continue
-        doOneFile(path0, args.tgtDir, depth=0)
+    pw = None
+    try:
+        if (args.executePlan):
+            executePlan(args.executePlan)
+        else:
+            pw = PowerWalk(args.files, open=False, close=False,
+                encoding=args.iencoding)
+            pw.applyOptionsFromArgparse(args)
+            walker = pw.traverse()
+            while (True):
+                with phase("walk"):
+                    path0, fh0, what0 = next(walker, (None, None, None))
+                if (path0 is None): break
+                if (what0 != PWType.LEAF): continue
+                doOneFile(path0, args.tgtDir, depth=0)
+    finally:
+        finishAll()
+        if (pool is not None): pool.shutdown()
+        finishVerify()
+        if (verifyPool is not None): verifyPool.shutdown()
+        if (verifyReport and verifyReport is not sys.stderr): verifyReport.close()
+        if (digestCache): digestCache.close()
+        if (planFile and planFile is not sys.stdout): planFile.close()
 
+    if (args.progress): showProgress(final=True)
+    if (args.statsJson): writeStats(args.statsJson)
     if (not args.quiet):
-        warning0("cpPP.py: Done, %d files.\n" % (pw.getStat("regular")))
+        warning0(summarize() + "\n")
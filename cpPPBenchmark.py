@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+#
+# cpPPBenchmark.py: Time cpPP.py copy strategies on synthetic trees.
+# 2026-10-17: Written by Steven J. DeRose.
+#
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import json
+import random
+import platform
+from collections import OrderedDict
+
+__metadata__ = {
+    "title"        : "cpPPBenchmark",
+    "description"  : "Time cpPP.py copy strategies on synthetic trees.",
+    "rightsHolder" : "Steven J. DeRose",
+    "creator"      : "http://viaf.org/viaf/50334488",
+    "type"         : "http://purl.org/dc/dcmitype/Software",
+    "language"     : "Python 3.7",
+    "created"      : "2026-10-17",
+    "modified"     : "2026-10-17",
+    "publisher"    : "http://github.com/sderose",
+    "license"      : "https://creativecommons.org/licenses/by-sa/3.0/"
+}
+__version__ = __metadata__["modified"]
+
+descr = """
+=Description=
+
+Build synthetic trees in a temporary directory, copy each one with every
+copy strategy `cpPP.py` offers (and with `shutil` as a baseline), and
+report the best time for each, so `--jobs`, `--bufferSize`, and
+`--copyMethod` can be chosen from data rather than guesses.
+
+The workloads (see `--workloads`) are:
+
+* ''tiny'' -- many tiny files (0-4KB) spread over a few hundred directories.
+* ''huge'' -- a few big files of random data (see `--size`).
+* ''sparse'' -- big sparse files: a little data every so often, holes between.
+* ''deep'' -- one very deep chain of directories, with a small file at each level.
+* ''conflicts'' -- many directories holding the same file names, all copied
+into one target directory (so cpPP must rename most of them).
+
+The strategies (see `--strategies`) are:
+
+* ''shutil'' -- `shutil.copytree` (or `shutil.copyfile`) in this process.
+* ''userspace'' -- `cpPP.py --copyMethod userspace`, a plain read/write loop.
+* ''auto'' -- `cpPP.py` with its defaults.
+* ''reflink'', ''copy_file_range'', ''sendfile'' -- that `--copyMethod`
+(falling back as cpPP does when the kernel refuses).
+* ''jobs4'', ''jobs16'' -- `--jobs 4` or `--jobs 16`.
+* ''buf64k'', ''buf4m'' -- userspace copying with a 64KiB or 4MiB buffer.
+* ''pipeline'' -- `--pipeline always`, overlapping reads and writes.
+* ''smallFiles'' -- `--smallFiles 64K --jobs 4`.
+
+Each combination is run `--repeat` times, and the best time is kept.
+Each copy is checked by counting the files and bytes at the target.
+Times for cpPP strategies include starting a Python process (often
+0.1 seconds or so), so use a big enough `--scale` to swamp that.
+The results (with the host, filesystem, and cpPP's own `--statsJson`
+counters, such as which copy methods were actually used) go to
+`--json` and `--markdown` (the Markdown table also goes to stdout).
+
+The pipeline mainly helps between devices, so use `--targetDir` to
+put the copies on another disk or mount. Also, the sources will usually be
+in the page cache after the first run; drop caches yourself (as root)
+between runs if you want cold reads.
+
+==Usage==
+
+    cpPPBenchmark.py [--scale 0.1] [--workloads tiny,huge] [--json r.json]
+
+=Related Commands=
+
+`cpPP.py`.
+
+=Known bugs and Limitations=
+
+Needs `cpPP.py` (and its PowerWalk dependency) in the same directory.
+
+Linux-oriented: the reflink and sparse cases only mean much on
+filesystems that support them (btrfs, XFS, ...).
+
+=History=
+
+* 2026-10-17: Written by Steven J. DeRose.
+Add synthetic tree workloads, more strategies, and JSON/Markdown reports.
+
+=Rights=
+
+Copyright 2026-10-17 by Steven J. DeRose. This work is licensed under a
+Creative Commons Attribution-Share-alike 3.0 unported license.
+See [http://creativecommons.org/licenses/by-sa/3.0/] for more information.
+
+For the most recent version, see [http://www.derose.net/steve/utilities]
+or [https://github.com/sderose].
+
+=Options=
+"""
+
+def log(lvl:int, msg:str) -> None:
+    if (args.verbose >= lvl): sys.stderr.write(msg + "\n")
+def warning0(msg:str) -> None: log(0, msg)
+def warning1(msg:str) -> None: log(1, msg)
+def warning2(msg:str) -> None: log(2, msg)
+def error(msg:str) -> None: log(0, msg)
+def fatal(msg:str) -> None: log(0, msg); sys.exit()
+
+cpPPPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cpPP.py")
+
+# Name -> extra cpPP.py options (None for the in-process shutil baseline).
+strategies = OrderedDict([
+    ("shutil",          None),
+    ("userspace",       [ "--copyMethod", "userspace" ]),
+    ("auto",            []),
+    ("reflink",         [ "--copyMethod", "reflink" ]),
+    ("copy_file_range", [ "--copyMethod", "copy_file_range" ]),
+    ("sendfile",        [ "--copyMethod", "sendfile" ]),
+    ("jobs4",           [ "--jobs", "4" ]),
+    ("jobs16",          [ "--jobs", "16" ]),
+    ("buf64k",          [ "--copyMethod", "userspace", "--bufferSize", "65536" ]),
+    ("buf4m",           [ "--copyMethod", "userspace", "--bufferSize", "4194304" ]),
+    ("pipeline",        [ "--pipeline", "always" ]),
+    ("smallFiles",      [ "--smallFiles", "64K", "--jobs", "4" ]),
+])
+
+
+###############################################################################
+# Workload generators. Each fills an empty directory and returns a Workload
+# saying what to pass to cpPP.py and what should arrive at the target.
+#
+class Workload:
+    def __init__(self, sources:list, recursive:bool=True):
+        self.sources = sources
+        self.recursive = recursive
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, path:str, size:int) -> None:
+        self.files += 1
+        self.bytes += size
+
+def scaled(n:float, least:int=1) -> int:
+    return max(least, int(n * args.scale))
+
+def writeFile(path:str, size:int, chunk:bytes=None) -> None:
+    """Write 'size' bytes to path, repeating 'chunk' (default: 1MiB random).
+    """
+    if (chunk is None): chunk = randomChunk
+    with open(path, "wb") as ofh:
+        left = size
+        while (left > 0):
+            ofh.write(chunk[:left])
+            left -= len(chunk)
+
+def makeTiny(root:str) -> Workload:
+    rnd = random.Random(1)
+    src = os.path.join(root, "tiny")
+    w = Workload([ src ])
+    nDirs = scaled(200)
+    for i in range(scaled(20000)):
+        d = os.path.join(src, "d%03d" % (i % nDirs))
+        os.makedirs(d, exist_ok=True)
+        size = rnd.randint(0, 4096)
+        writeFile(os.path.join(d, "f%05d.txt" % (i)), size)
+        w.add(d, size)
+    return w
+
+def makeHuge(root:str) -> Workload:
+    src = os.path.join(root, "huge")
+    os.makedirs(src)
+    w = Workload([ src ])
+    for i in range(3):
+        size = scaled(args.size)
+        writeFile(os.path.join(src, "big%d.bin" % (i)), size)
+        w.add(src, size)
+    return w
+
+def makeSparse(root:str) -> Workload:
+    """Files of --size apparent bytes, with 1MiB of data every 16MiB.
+    """
+    src = os.path.join(root, "sparse")
+    os.makedirs(src)
+    w = Workload([ src ])
+    for i in range(4):
+        size = scaled(args.size, least=16<<20)
+        with open(os.path.join(src, "image%d.img" % (i)), "wb") as ofh:
+            for offset in range(0, size, 16<<20):
+                ofh.seek(offset)
+                ofh.write(randomChunk[:min(1<<20, size-offset)])
+            ofh.truncate(size)
+        w.add(src, size)
+    return w
+
+def makeDeep(root:str) -> Workload:
+    src = os.path.join(root, "deep")
+    w = Workload([ src ])
+    d = src
+    for i in range(scaled(300)):
+        d = os.path.join(d, "d%03d" % (i))
+        os.makedirs(d)
+        writeFile(os.path.join(d, "leaf.txt"), 100)
+        w.add(d, 100)
+    return w
+
+def makeConflicts(root:str) -> Workload:
+    """The same names in many directories, all copied to one target dir.
+    """
+    src = os.path.join(root, "conflicts")
+    w = Workload([], recursive=False)
+    for i in range(scaled(100)):
+        d = os.path.join(src, "dir%03d" % (i))
+        os.makedirs(d)
+        for name in [ "README", "index.html", "data.csv", "notes.txt" ]:
+            path = os.path.join(d, name)
+            writeFile(path, 1000)
+            w.sources.append(path)
+            w.add(d, 1000)
+    return w
+
+workloads = OrderedDict([
+    ("tiny",      makeTiny),
+    ("huge",      makeHuge),
+    ("sparse",    makeSparse),
+    ("deep",      makeDeep),
+    ("conflicts", makeConflicts),
+])
+
+
+###############################################################################
+#
+def runStrategy(name:str, w:Workload, tgtDir:str, statsPath:str) -> float:
+    """Copy the workload into (empty) tgtDir with one strategy; return seconds.
+    """
+    opts = strategies[name]
+    t0 = time.perf_counter()
+    if (opts is None):
+        shutilCopy(w, tgtDir)
+    else:
+        cmd = [ sys.executable, cpPPPath, "--quiet",
+            "--bufferSize", str(args.bufferSize), "--statsJson", statsPath ]
+        if (w.recursive): cmd.append("-R")
+        cmd += opts + w.sources + [ tgtDir ]
+        warning2("Running: %s" % (" ".join(cmd[:12])))
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+def shutilCopy(w:Workload, tgtDir:str) -> None:
+    """The baseline: copytree for directories; for loose files, copyfile,
+    adding a serial number when the name is taken (as cpPP would).
+    """
+    for src in w.sources:
+        if (os.path.isdir(src)):
+            shutil.copytree(src, os.path.join(tgtDir, os.path.basename(src)),
+                dirs_exist_ok=True)
+            continue
+        tgt = os.path.join(tgtDir, os.path.basename(src))
+        n = 0
+        while (os.path.exists(tgt)):
+            tgt = os.path.join(tgtDir, "%s_%04d" % (os.path.basename(src), n))
+            n += 1
+        shutil.copyfile(src, tgt)
+
+def measureTree(path:str) -> (int, int, int):
+    """Return the number of files, their total size, and the space they use.
+    """
+    nFiles = nBytes = nUsed = 0
+    for dirpath, _dirs, names in os.walk(path):
+        for name in names:
+            st = os.lstat(os.path.join(dirpath, name))
+            nFiles += 1
+            nBytes += st.st_size
+            nUsed += st.st_blocks * 512
+    return nFiles, nBytes, nUsed
+
+def emptyDir(path:str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+def hostInfo(srcRoot:str, tgtRoot:str) -> dict:
+    def fsType(path:str) -> str:
+        try:
+            out = subprocess.run([ "stat", "-f", "-c", "%T", path ],
+                capture_output=True, text=True).stdout.strip()
+            return out or None
+        except OSError:
+            return None
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "sourceFs": fsType(srcRoot),
+        "targetFs": fsType(tgtRoot),
+        "sameDevice": (os.stat(srcRoot).st_dev == os.stat(tgtRoot).st_dev),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "when": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def runWorkload(wname:str, srcRoot:str, tgtRoot:str) -> list:
+    """Generate one workload, time each strategy on it, return result dicts.
+    """
+    warning0("Generating workload '%s'..." % (wname))
+    wdir = os.path.join(srcRoot, wname)
+    os.makedirs(wdir)
+    w = workloads[wname](wdir)
+    statsPath = os.path.join(srcRoot, "stats.json")
+    results = []
+    for sname in args.strategies.split(","):
+        rec = OrderedDict([ ("workload", wname), ("strategy", sname),
+            ("files", w.files), ("bytes", w.bytes), ("times", []) ])
+        try:
+            for _i in range(args.repeat):
+                emptyDir(tgtRoot)
+                rec["times"].append(runStrategy(sname, w, tgtRoot, statsPath))
+                nFiles, nBytes, nUsed = measureTree(tgtRoot)
+                if ((nFiles, nBytes) != (w.files, w.bytes)):
+                    raise ValueError("target has %d files, %d bytes; expected %d, %d"
+                        % (nFiles, nBytes, w.files, w.bytes))
+            rec["seconds"] = min(rec["times"])
+            rec["MBps"] = w.bytes / rec["seconds"] / 1e6
+            rec["filesPerSec"] = w.files / rec["seconds"]
+            rec["targetSpaceUsed"] = nUsed
+            if (strategies[sname] is not None and os.path.exists(statsPath)):
+                with open(statsPath) as ifh:
+                    counts = json.load(ifh).get("counts", {})
+                rec["methods"] = { k[7:]: v for k, v in counts.items()
+                    if k.startswith("method:") }
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            error("Strategy '%s' failed on '%s': %s" % (sname, wname, e))
+            rec["error"] = str(e)
+        results.append(rec)
+        warning1("  %-16s %s" % (sname, ("%.3fs" % rec["seconds"])
+            if ("seconds" in rec) else "FAILED"))
+    shutil.rmtree(wdir, ignore_errors=True)
+    return results
+
+def markdownReport(host:dict, results:list) -> str:
+    lines = [ "# cpPP.py benchmark", "",
+        "Host: %s, Python %s, %d CPUs. Source fs %s, target fs %s%s." % (
+            host["platform"], host["python"], host["cpus"], host["sourceFs"],
+            host["targetFs"], " (same device)" if (host["sameDevice"]) else ""),
+        "Scale %s, best of %d runs, %s." % (
+            host["scale"], host["repeat"], host["when"]) ]
+    for wname in workloads:
+        rows = [ r for r in results if r["workload"] == wname ]
+        if (not rows): continue
+        base = [ r.get("seconds") for r in rows if r["strategy"] == "shutil" ]
+        base = base[0] if (base) else None
+        lines += [ "", "## %s (%d files, %.1f MB)" % (
+            wname, rows[0]["files"], rows[0]["bytes"]/1e6), "",
+            "| strategy | seconds | MB/s | files/s | vs shutil | space used | methods |",
+            "|---|---:|---:|---:|---:|---:|---|" ]
+        for r in rows:
+            if ("seconds" not in r):
+                lines.append("| %s | failed | | | | | %s |" % (
+                    r["strategy"], r["error"].replace("|", "/")))
+                continue
+            lines.append("| %s | %.3f | %.1f | %.0f | %s | %.1f MB | %s |" % (
+                r["strategy"], r["seconds"], r["MBps"], r["filesPerSec"],
+                ("%.2fx" % (base / r["seconds"])) if (base) else "",
+                r["targetSpaceUsed"]/1e6,
+                ", ".join("%s %d" % kv for kv in sorted(r.get("methods", {}).items()))))
+    return "\n".join(lines) + "\n"
+
+
+###############################################################################
+# Main
+#
+if __name__ == "__main__":
+    import argparse
+
+    def parseSize(s:str) -> int:
+        s = s.strip().upper().rstrip("B").rstrip("I")
+        mult = 1
+        if (s and s[-1] in "KMGT"):
+            mult = 1024 ** ("KMGT".index(s[-1]) + 1)
+            s = s[:-1]
+        return int(float(s) * mult)
+
+    def checkNames(parser, kind:str, given:str, known:dict) -> None:
+        for name in given.split(","):
+            if (name not in known):
+                parser.error("Unknown %s '%s'. Known: %s." %
+                    (kind, name, ", ".join(known.keys())))
+
+    def processOptions() -> argparse.Namespace:
+        try:
+            from BlockFormatter import BlockFormatter
+            parser = argparse.ArgumentParser(
+                description=descr, formatter_class=BlockFormatter)
+        except ImportError:
+            parser = argparse.ArgumentParser(description=descr)
+
+        parser.add_argument(
+            "--bufferSize", "--buffer-size", type=parseSize, default=1<<20,
+            metavar="N", help="Pass --bufferSize N to cpPP.py. Default: 1MiB.")
+        parser.add_argument(
+            "--json", type=str, metavar="PATH",
+            help="Write the full results as JSON to PATH.")
+        parser.add_argument(
+            "--keep", action="store_true",
+            help="Don't delete the temporary directories afterward.")
+        parser.add_argument(
+            "--markdown", type=str, metavar="PATH",
+            help="Also write the Markdown report to PATH.")
+        parser.add_argument(
+            "--quiet", "-q", action="store_true",
+            help="Suppress most messages.")
+        parser.add_argument(
+            "--repeat", type=int, default=3, metavar="N",
+            help="Run each strategy N times and keep the best. Default: 3.")
+        parser.add_argument(
+            "--scale", type=float, default=1.0, metavar="F",
+            help="Multiply file counts, depth, and sizes by F. Default: 1.0.")
+        parser.add_argument(
+            "--size", type=parseSize, default=256<<20, metavar="N",
+            help="Size of each huge or sparse file (K, M, G suffixes ok). Default: 256M.")
+        parser.add_argument(
+            "--strategies", type=str, default=",".join(strategies.keys()),
+            metavar="S,S,...", help="Which strategies to run (default: all).")
+        parser.add_argument(
+            "--targetDir", "--target-dir", type=str, metavar="PATH",
+            help="Copy to a temporary directory under PATH (e.g. another device).")
+        parser.add_argument(
+            "--tmpDir", "--tmp-dir", type=str, metavar="PATH",
+            help="Make the sources under PATH (default: system temp dir).")
+        parser.add_argument(
+            "--verbose", "-v", action="count", default=0,
+            help="Add more messages (repeatable).")
+        parser.add_argument(
+            "--version", action="version", version=__version__,
+            help="Display version information, then exit.")
+        parser.add_argument(
+            "--workloads", type=str, default=",".join(workloads.keys()),
+            metavar="W,W,...", help="Which workloads to run (default: all).")
+
+        args0 = parser.parse_args()
+        checkNames(parser, "strategy", args0.strategies, strategies)
+        checkNames(parser, "workload", args0.workloads, workloads)
+        if (args0.repeat < 1 or args0.scale <= 0):
+            parser.error("--repeat and --scale must be positive.")
+        if (args0.quiet): args0.verbose = -1
+        return(args0)
+
+    ###########################################################################
+    #
+    args = processOptions()
+    randomChunk = os.urandom(1<<20)
+
+    srcRoot = tempfile.mkdtemp(prefix="cpPPBench-src-", dir=args.tmpDir)
+    tgtRoot = tempfile.mkdtemp(prefix="cpPPBench-tgt-", dir=args.targetDir)
+    try:
+        host = hostInfo(srcRoot, tgtRoot)
+        if (host["sameDevice"]):
+            warning1("Note: source and target are on the same device.")
+        results = []
+        for wname in args.workloads.split(","):
+            results.extend(runWorkload(wname, srcRoot, tgtRoot))
+
+        report = markdownReport(host, results)
+        print(report)
+        if (args.markdown):
+            with open(args.markdown, "w") as ofh: ofh.write(report)
+        if (args.json):
+            with open(args.json, "w") as ofh:
+                json.dump({ "host": host, "results": results }, ofh, indent=2)
+                ofh.write("\n")
+    finally:
+        if (args.keep):
+            warning0("Left files in %s and %s." % (srcRoot, tgtRoot))
+        else:
+            shutil.rmtree(srcRoot, ignore_errors=True)
+            shutil.rmtree(tgtRoot, ignore_errors=True)
@@ -6,14 +6,17 @@
 import sys
 import os
 import re
-from xml.dom.minidom import Node
-import logging
+import codecs
+import stat
+import importlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
 #from typing import IO, Dict, List, Union
 
 from PowerWalk import PowerWalk, PWType
 
-lg = logging.getLogger("wcPP.py")
-
 __metadata__ = {
     "title"        : "wcPP",
     "description"  : "A slightly smarter version of 'wc' (word-count).",
@@ -22,7 +25,7 @@ __metadata__ = {
     "type"         : "http://purl.org/dc/dcmitype/Software",
     "language"     : "Python 3.7",
     "created"      : "2022-02-24",
-    "modified"     : "2022-02-24",
+    "modified"     : "2026-10-17",
     "publisher"    : "http://github.com/sderose",
     "license"      : "https://creativecommons.org/licenses/by-sa/3.0/"
 }
@@ -47,8 +50,70 @@ A slightly smarter version of 'wc' (word-count). Specifically:
 
 If none of -b, -c, -l, or -w is specified, all will be counted.
 
+Files ending in .xml, .html, or .htm are parsed, and only their text
+content is counted (for HTML, not counting scripts and styles). The
+parsing is streamed (with `XMLPullParser` or `HTMLParser`), and parts of
+the document are discarded once counted, so even very large files take
+little memory. Each tag ends any word in progress.
+
 If neither -c nor -w is active, no attempt is made to decode the input text.
 
+Files are read in blocks (see `--blockSize`), counting newlines and bytes
+directly on the raw data, so memory use stays flat however big the file
+is. When nothing needs decoding (-l, -b, or -c for UTF-8), every block is
+read into the same reused buffer, and with only -b a regular file is not
+read at all: its size comes from `fstat`, as for `wc -c`. -l is bounded by
+Python's `bytes.count()` (about 2GB/s on one core), several times slower
+than coreutils `wc -l`; for big files, `--jobs` (below) spreads it over
+cores. With `--jobs N`, files are counted by a pool of N worker processes,
+in batches, while the directory walk goes on. Per-file lines are still
+printed in traversal order, and the grand totals are the same.
+Files bigger than `--splitSize` are cut into pieces of that size,
+which are counted in parallel and then merged, allowing for lines,
+words, and UTF-8 characters cut at the piece boundaries. The results
+match counting the file straight through. Files are only split if
+the encoding is UTF-8 or single-byte, or if there is no need to
+decode them (just -l and/or -b).
+
+With `--countCache PATH`, each file's counts are saved in an SQLite
+database, keyed by device, inode, and what is being counted (the
+encoding and word definition matter for -c and -w). On later runs, a
+file whose size and modification time (to the nanosecond) are unchanged
+is answered from the cache without being read. `-v` reports the number
+of cache hits and misses.
+
+As with `wc`, -l counts newline characters, so a last line with
+no newline is not counted.
+
+==Words==
+
+`--wordDef` chooses what counts as a word:
+
+* ''whitespace'' (the default) -- maximal runs of non-whitespace
+characters (Unicode whitespace, as for Python `str.split()`).
+* ''unicode'' -- runs of Unicode word characters (letters, digits, and
+underscore, like regex `\\w+`), so punctuation separates words.
+* ''alnum'' -- runs of letters and digits only.
+* ''regex'' -- each match of `--wordRegex` is a word (giving `--wordRegex`
+implies this). Matches cannot span lines. To keep memory flat, a line
+longer than a million characters is counted in pieces, each cut at the
+start of its last match; so in such lines anchors and lookbehinds may
+take a cut for a line start, and a match over half that long may be split.
+
+For UTF-8 and ASCII-compatible single-byte encodings, blocks that are
+pure ASCII are counted without decoding, by translating each byte to
+"word" or "not word" and counting the word starts. With ''whitespace''
+and UTF-8, so are blocks that contain no non-ASCII space characters.
+Otherwise the text is decoded. `wcPPBenchmark.py` (next to this script)
+times each definition on the same text.
+
+For UTF-8 (the default `--iencoding`), characters are counted without
+decoding, as the number of bytes that do not start with binary 10
+(continuation bytes, 0x80-0xBF); blocks that are pure ASCII just count
+their length. So -c is about as fast as -b. For malformed UTF-8 this
+can differ from what a decoder would say (a stray continuation byte is
+not counted at all, for example). Other encodings are decoded.
+
 Output goes in the order: line, word, character, byte, and filename.
 
 ==Usage==
@@ -67,8 +132,6 @@ Output goes in the order: line, word, character, byte, and filename.
 
 =To do=
 
-* Provide several alternative definitions for "words" to count. At the moment, just
-splits on \\s+.
 * Learn more file formats and count just "text" in them
 MarkDown, POD, etc).
 * Add a strftime-like format-string option.
@@ -77,6 +140,12 @@ MarkDown, POD, etc).
 =History=
 
 * 2022-02-24: Written by Steven J. DeRose.
+* 2026-10-17: Count in constant memory from raw blocks, decoding only for
+-c or -w. Read undecoded blocks into one buffer; take -b alone from fstat.
+Add `--jobs`, splitting big files. Add `--countCache`.
+Count UTF-8 characters without decoding. Add `--wordDef`.
+Stream XML and HTML instead of loading them with minidom.
+Fix option names used by report(), -w, and text-node extraction.
 
 
 =Rights=
@@ -93,82 +162,683 @@ or [https://github.com/sderose].
 """
 
 
+def log(lvl:int, msg:str) -> None:
+    if (args.verbose >= lvl): sys.stderr.write(msg + "\n")
+def warning0(msg:str) -> None: log(0, msg)
+def warning1(msg:str) -> None: log(1, msg)
+def warning2(msg:str) -> None: log(2, msg)
+def error(msg:str) -> None: log(0, msg)
+def fatal(msg:str) -> None: log(0, msg); sys.exit()
+
+
 ###############################################################################
 #
-totals = {
-    "byte": 0,
-    "char": 0,
-    "word": 0,
-    "line": 0,
-}
+def newTotals() -> dict:
+    return { "line": 0, "word": 0, "char": 0, "byte": 0 }
+
+grandTotals = newTotals()
+
+def addTotals(tots:dict, more:dict) -> None:
+    for k in tots.keys():
+        tots[k] += more[k]
+
+# Bytes that are not the first byte of a UTF-8 sequence.
+utf8Continuation = bytes(range(0x80, 0xC0))
+
+def isUtf8() -> bool:
+    return (codecs.lookup(args.iencoding).name == "utf-8")
+
+def needsDecoding() -> bool:
+    """Words always need decoded text; characters only do for encodings
+    other than UTF-8 (see countBlocks()).
+    """
+    return args.words or (args.characters and not isUtf8())
+
+def isSingleByte() -> bool:
+    """Is the encoding one byte per character (a charmap codec)?
+    """
+    name = codecs.lookup(args.iencoding).name
+    if (name in [ "ascii", "latin-1" ]): return True
+    try:
+        codecMod = importlib.import_module("encodings." + name.replace("-", "_"))
+    except ImportError:
+        return False
+    return hasattr(codecMod, "decoding_table")
+
+def asciiCompatible() -> bool:
+    """Can bytes under 0x80 always be taken as ASCII characters, even
+    without decoding the rest? True for UTF-8 and most single-byte sets.
+    """
+    if (isUtf8()): return True
+    asciiChars = "".join(chr(c) for c in range(128))
+    return (isSingleByte() and
+        bytes(range(128)).decode(args.iencoding, errors="replace") == asciiChars)
 
-grandTotals = totals.copy()
 
-def clearTotals():
-    for k in totals.keys():
-        totals[k] = 0
+###############################################################################
+# Word definitions (--wordDef). Except for "regex", a word is a maximal run
+# of "word characters", so counts for adjacent pieces of text add up
+# once any word spanning the join is subtracted. Each definition has:
+#     isWordChar -- test one decoded character
+#     countText  -- count words in a decoded string, by the fastest means
+#         found for that definition (see wcPPBenchmark.py)
+#     byteTable  -- for bytes.translate(), mapping each byte to b"a" if it
+#         is part of a word or b" " if not, so that ASCII text can be
+#         counted as t.count(b" a") with no decoding or lists at all
+#     notInUtf8  -- if set, a bytes regex for the only non-ASCII UTF-8
+#         sequences that are not word characters; UTF-8 blocks lacking
+#         them can use byteTable too (non-ASCII bytes map to b"a")
+#
+class WordDef:
+    def __init__(self, name:str, isWordChar, countText, notInUtf8=None):
+        self.name = name
+        self.isWordChar = isWordChar
+        self.countText = countText
+        self.byteTable = bytes(ord("a") if (c >= 0x80 or isWordChar(chr(c)))
+            else ord(" ") for c in range(256))
+        self.notInUtf8 = notInUtf8
+
+reWordChars = re.compile(r"\w+")
+reAlnumChars = re.compile(r"[^\W_]+")
+
+wordDefs = {
+    "whitespace": WordDef("whitespace",
+        lambda c: not c.isspace(),
+        lambda text: len(text.split()),
+        # U+0085, U+00A0, U+1680, U+2000-U+200A, U+2028, U+2029, U+202F,
+        # U+205F, and U+3000: the non-ASCII characters for which isspace().
+        notInUtf8=re.compile(
+            rb"\xC2[\x85\xA0]|\xE1\x9A\x80|\xE2\x80[\x80-\x8A\xA8\xA9\xAF]|" +
+            rb"\xE2\x81\x9F|\xE3\x80\x80")),
+    "unicode": WordDef("unicode",
+        lambda c: c.isalnum() or c == "_",
+        lambda text: len(reWordChars.findall(text))),
+    "alnum": WordDef("alnum",
+        lambda c: c.isalnum(),
+        lambda text: len(reAlnumChars.findall(text))),
+}
 
-def countRec(_path:str, _recnum:int, rec:str):
-    totals["line"] += 1
-    totals["byte"] += len(rec)
-    if (args.characters or args.words):
-        totals["char"] += len(rec)
-        totals["word"] += len(tokenize(rec))
+def getWordDef() -> WordDef:
+    return wordDefs.get(args.wordDef)
 
-def tokenize(s:str) -> list:
-    # TODO Overly simplistic...
-    return re.split(r"\s+", s)
+def utf8Incomplete(buf:bytes) -> int:
+    """Return how many bytes at the end of buf are an incomplete UTF-8
+    sequence (0 to 3).
+    """
+    for i in range(1, min(4, len(buf)+1)):
+        b = buf[-i]
+        if (b < 0x80): return 0
+        if (b >= 0xC0):
+            need = 2 if (b < 0xE0) else 3 if (b < 0xF0) else 4
+            return i if (i < need) else 0
+    return 0
+
+class TextCounter:
+    """Count characters and words in text that arrives in pieces, either
+    raw (feedBytes()) or decoded (feed()). A word that straddles two
+    pieces is only counted once. Call finish() after the last piece.
+    """
+    def __init__(self, tots:dict, countChars:bool=True, decoder=None):
+        self.tots = tots
+        self.countChars = countChars
+        self.decoder = decoder
+        self.wordDef = getWordDef()
+        self.wordRegex = None if (self.wordDef) else re.compile(args.wordRegex)
+        self.rawAscii = (args.words and self.wordDef is not None and
+            (not decoder or asciiCompatible()))
+        self.rawUtf8 = (self.rawAscii and self.wordDef.notInUtf8 is not None
+            and isUtf8())
+        self.held = b""     # Incomplete UTF-8 sequence from the last piece
+        self.carry = ""     # Unfinished line, for --wordDef regex
+        self.inWord = False
+        self.startsInWord = None
+
+    def feedBytes(self, buf:bytes) -> None:
+        """Count a raw block, without decoding it if the word definition
+        allows (see WordDef).
+        """
+        if (self.rawUtf8):
+            if (self.held): buf = self.held + buf
+            n = utf8Incomplete(buf)
+            if (n):
+                self.held = buf[-n:]
+                buf = buf[:-n]
+            else:
+                self.held = b""
+        if (not buf): return
+        if (self.rawAscii and (buf.isascii() or (self.rawUtf8 and
+            not self.wordDef.notInUtf8.search(buf)))):
+            if (self.decoder.getstate()[0]):  # From malformed input
+                self.feed(self.decoder.decode(b"", final=True))
+                self.decoder.reset()
+            self.feedRaw(buf)
+        else:
+            self.feed(self.decoder.decode(buf))
+
+    def feedRaw(self, buf:bytes) -> None:
+        if (self.countChars): self.tots["char"] += len(buf)
+        t = buf.translate(self.wordDef.byteTable)
+        first = (t[0] == 0x61)
+        n = t.count(b" a") + first
+        if (self.startsInWord is None): self.startsInWord = first
+        if (self.inWord and first): n -= 1
+        self.tots["word"] += n
+        self.inWord = (t[-1] == 0x61)
+
+    def feed(self, text:str) -> None:
+        if (not text): return
+        if (self.countChars): self.tots["char"] += len(text)
+        if (not args.words): return
+        if (self.wordRegex):
+            self.feedLines(text)
+            return
+        first = self.wordDef.isWordChar(text[0])
+        if (self.startsInWord is None): self.startsInWord = first
+        n = self.wordDef.countText(text)
+        if (self.inWord and first): n -= 1
+        self.tots["word"] += n
+        self.inWord = self.wordDef.isWordChar(text[-1])
+
+    maxCarry = 1<<20
+
+    def feedLines(self, text:str) -> None:
+        """For --wordRegex, count matches a whole line at a time (so matches
+        cannot span lines), holding back any unfinished last line. If that
+        gets longer than maxCarry, count all its matches but the last, and
+        hold back only from there (or nothing, if the last is that long).
+        """
+        text = self.carry + text
+        cut = text.rfind("\n") + 1
+        if (cut): self.tots["word"] += countMatches(self.wordRegex, text[:cut])
+        self.carry = text[cut:]
+        if (len(self.carry) <= self.maxCarry): return
+        n = 0
+        last = None
+        for last in self.wordRegex.finditer(self.carry): n += 1
+        if (last is not None and len(self.carry) - last.start() <= self.maxCarry // 2):
+            self.tots["word"] += n - 1
+            self.carry = self.carry[last.start():]
+        else:
+            self.tots["word"] += n
+            self.carry = ""
+
+    def breakWord(self) -> None:
+        """Don't let the next text continue the current word (or line, for
+        --wordRegex), as when markup comes between them.
+        """
+        self.inWord = False
+        if (self.carry):
+            self.tots["word"] += countMatches(self.wordRegex, self.carry)
+            self.carry = ""
+
+    def finish(self) -> None:
+        if (self.held): self.feed(self.decoder.decode(self.held))
+        if (self.decoder): self.feed(self.decoder.decode(b"", final=True))
+        if (self.carry):
+            self.tots["word"] += countMatches(self.wordRegex, self.carry)
+            self.carry = ""
+
+def countMatches(regex, text:str) -> int:
+    n = 0
+    for _m in regex.finditer(text): n += 1
+    return n
 
 def report(tots:dict, filename:str):
-    buf = ""
-    if (args.line):      buf += "%6d" % (tots["line"])
-    if (args.word):      buf += "%6d" % (tots["word"])
-    if (args.character): buf += "%6d" % (tots["char"])
-    if (args.byte):      buf += "%6d" % (tots["byte"])
-    if (args.filename):  buf += "%s" % (filename)
+    fields = []
+    if (args.lines):      fields.append("%7d" % (tots["line"]))
+    if (args.words):      fields.append("%7d" % (tots["word"]))
+    if (args.characters): fields.append("%7d" % (tots["char"]))
+    if (args.bytes):      fields.append("%7d" % (tots["byte"]))
+    if (args.fileNames and filename):  fields.append(filename)
+    buf = " ".join(fields)
     print(buf)
 
 
 ###############################################################################
+# Parallel counting. With --jobs, paths are sent to a process pool in
+# batches (of up to filesPerTask files or bytesPerTask bytes, so a few
+# huge files don't all land on one worker). Files over --splitSize are
+# instead cut into byte ranges, counted separately and merged (see
+# countRange() and mergeRanges()). Results are reported and added to
+# grandTotals in the main process, in traversal order.
+#
+filesPerTask = 32
+bytesPerTask = 64 << 20
+
+pool = None
+pending = deque()  # (path, stat, how, what), oldest first; see finishOldest()
+batch = []
+batchBytes = 0
+
+def initWorker(args0) -> None:
+    global args
+    args = args0
+
+def countBatch(paths:list) -> list:
+    return [ countPath(path) for path in paths ]
+
+def dispatchCount(path:str) -> None:
+    """Count path now, or (with --jobs) add it to the batch for the pool.
+    With --countCache, unchanged files are answered from the cache.
+    """
+    global batchBytes
+    st = None
+    try:
+        st = os.stat(path)
+    except OSError:
+        pass  # countPath() will report it
+    if (countCache and st):
+        tots = countCache.lookup(st, cacheConfig(path))
+        if (tots):
+            if (pool is None):
+                finishCount(path, tots)
+            else:  # Files already batched go first, to keep the order
+                submitBatch()
+                pending.append((path, None, "done", tots))
+            return
+    if (pool is None):
+        finishCount(path, countPath(path), st)
+        return
+    size = st.st_size if (st) else 0
+    if (args.splitSize and size > args.splitSize and isSplittable(path)):
+        submitBatch()
+        futs = [ pool.submit(countRange, path, start,
+            min(start + args.splitSize, size))
+            for start in range(0, size, args.splitSize) ]
+        pending.append((path, st, "ranges", futs))
+        waitForRoom()
+        return
+    batch.append((path, st))
+    batchBytes += size
+    if (len(batch) >= filesPerTask or batchBytes >= bytesPerTask):
+        submitBatch()
+
+def submitBatch() -> None:
+    global batch, batchBytes
+    if (not batch): return
+    fut = pool.submit(countBatch, [ path for path, _st in batch ])
+    for i, (path, st) in enumerate(batch):
+        pending.append((path, st, "batch", (fut, i)))
+    batch = []
+    batchBytes = 0
+    waitForRoom()
+
+def waitForRoom() -> None:
+    while (len(pending) > 4 * args.jobs * filesPerTask):
+        finishOldest()
+
+def finishOldest() -> None:
+    """Report the oldest pending file. Its counts are already known
+    ("done"), or come from one slot of a batch result ("batch"), or
+    from merging byte ranges ("ranges").
+    """
+    path, st, how, what = pending.popleft()
+    if (how == "done"):
+        tots = what
+    elif (how == "batch"):
+        fut, i = what
+        tots = fut.result()[i]
+    else:
+        tots = mergeRanges([ f.result() for f in what ])
+    finishCount(path, tots, st)
+
+def finishAll() -> None:
+    if (pool is not None): submitBatch()
+    while (pending):
+        finishOldest()
+
+def finishCount(path:str, tots:dict, st:os.stat_result=None) -> None:
+    """Report a file's counts and add them to grandTotals. If 'st' is
+    given, the counts are new, so cache them too.
+    """
+    if (tots is None): return
+    if (countCache and st): countCache.store(st, cacheConfig(path), tots)
+    report(tots, path)
+    addTotals(grandTotals, tots)
+
+
+###############################################################################
+# Count cache (--countCache). Counts are kept in SQLite across runs, keyed
+# by (dev, inode) and by what was counted (see cacheConfig()); a row is
+# only used if the file's size and mtime_ns still match. The cache is only
+# touched by the main process.
+#
+class CountCache:
+    def __init__(self, path:str):
+        import sqlite3
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS counts (
+            dev INTEGER, ino INTEGER, config TEXT, size INTEGER,
+            mtime_ns INTEGER, lines INTEGER, words INTEGER, chars INTEGER,
+            bytes INTEGER, PRIMARY KEY (dev, ino, config))""")
+        self.nUncommitted = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, st:os.stat_result, config:str) -> dict:
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, lines, words, chars, bytes FROM counts " +
+            "WHERE dev=? AND ino=? AND config=?",
+            (st.st_dev, st.st_ino, config)).fetchone()
+        if (row and row[0] == st.st_size and row[1] == st.st_mtime_ns):
+            self.hits += 1
+            return { "line": row[2], "word": row[3], "char": row[4], "byte": row[5] }
+        self.misses += 1
+        return None
+
+    def store(self, st:os.stat_result, config:str, tots:dict) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO counts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (st.st_dev, st.st_ino, config, st.st_size, st.st_mtime_ns,
+            tots["line"], tots["word"], tots["char"], tots["byte"]))
+        self.nUncommitted += 1
+        if (self.nUncommitted >= 1000):
+            self.conn.commit()
+            self.nUncommitted = 0
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+countCache = None
+
+def cacheConfig(path:str) -> str:
+    """Describe what counting path involves, since the cached counts are
+    only good for the same kind of file, encoding, word definition, and
+    fields counted (a -c run may skip words, and a -w run characters).
+    """
+    _name, ext = os.path.splitext(path)
+    kind = "markup" if (ext in [ ".xml", ".html", ".htm" ]) else "text"
+    if (not (args.characters or args.words)):
+        # Markup text is always decoded (and re-encoded for -b).
+        if (kind == "markup"):
+            return "%s:raw:%s" % (kind, codecs.lookup(args.iencoding).name)
+        return kind + ":raw"
+    fields = ("c" if (args.characters) else "") + ("w" if (args.words) else "")
+    wordDef = args.wordDef
+    if (wordDef == "regex"): wordDef += "=" + args.wordRegex
+    return "%s:%s:%s:%s" % (kind, fields, codecs.lookup(args.iencoding).name,
+        wordDef)
+
+
+###############################################################################
+# Counting part of a file. Lines and bytes simply add up across ranges.
+# For characters and words, each range is moved forward to a character
+# boundary (past any UTF-8 continuation bytes), so neighbouring ranges
+# split the text exactly where the serial decoder would; then a word that
+# spans a boundary is counted once, by checking whether the text on each
+# side of it is whitespace.
 #
-def doOneFile(path:str) -> int:
-    """Read and deal with one individual file.
+def isSplittable(path:str) -> bool:
+    """Only split files whose character boundaries can be found from any
+    offset: with no decoding, or for UTF-8 or single-byte encodings.
+    Not worth it for just -b, which countRaw() takes from fstat.
+    """
+    _name, ext = os.path.splitext(path)
+    if (ext in [ ".xml", ".html", ".htm" ]): return False
+    if (not needsDecoding()):
+        return bool(args.lines or (args.characters and isUtf8()))
+    if (args.words and args.wordDef == "regex"): return False
+    return isUtf8() or isSingleByte()
+
+def charBoundary(fh, offset:int, end:int) -> int:
+    """Return the first offset at or after 'offset' (but not past 'end')
+    that does not hold a UTF-8 continuation byte.
+    """
+    if (not isUtf8()): return offset
+    fh.seek(offset)
+    while (offset < end):
+        buf = fh.read(min(64, end - offset))
+        if (not buf): break
+        for b in buf:
+            if (b < 0x80 or b > 0xBF): return offset
+            offset += 1
+    return offset
+
+def countRange(path:str, start:int, end:int) -> tuple:
+    """Count bytes [start:end) of path (adjusted to character boundaries).
+    Returns the totals, and whether the range's text starts and ends
+    inside a word (None if it has no text).
+    """
+    with open(path, "rb") as fh:
+        if (needsDecoding()):
+            size = os.fstat(fh.fileno()).st_size
+            if (start > 0): start = charBoundary(fh, start, size)
+            if (end < size): end = charBoundary(fh, end, size)
+        fh.seek(start)
+        edges = {}
+        tots = countBlocks(rangeBlocks(fh, end - start), edges)
+    return tots, edges.get("first"), edges.get("last")
+
+def rangeBlocks(fh, length:int):
+    while (length > 0):
+        buf = fh.read(min(args.blockSize, length))
+        if (not buf): break
+        length -= len(buf)
+        yield buf
+
+def mergeRanges(results:list) -> dict:
+    """Add up countRange() results for consecutive ranges of one file.
+    """
+    tots = newTotals()
+    prevLast = False
+    for rtots, first, last in results:
+        addTotals(tots, rtots)
+        if (first is None): continue
+        if (prevLast and first): tots["word"] -= 1
+        prevLast = last
+    return tots
+
+
+###############################################################################
+#
+def countPath(path:str) -> dict:
+    """Count one file, just the text content for XML and HTML.
+    """
+    _name, ext = os.path.splitext(path)
+    try:
+        if (ext in [ ".xml", ".html", ".htm" ]):
+            return doOneXmlFile(path)
+        return doOneFile(path)
+    except UnicodeError as e:
+        error("Cannot decode '%s' as %s: %s" % (path, args.iencoding, e))
+        return None
+
+def doOneFile(path:str) -> dict:
+    """Count one file (or stdin if path is empty). Returns its totals, or
+    None if it cannot be read.
     """
     if (not path):
         if (sys.stdin.isatty() and not args.quiet): print("Waiting on STDIN...")
-        fh = sys.stdin
-    else:
-        try:
-            fh = open(path, "rb", encoding=args.iencoding)
-        except IOError as e:
-            lg.info("Cannot open '%s':\n    %s", path, e)
-            return 0
-
-    clearTotals()
-    for recnum, rec in enumerate(fh.readlines()):
-        countRec(path, recnum, rec)
-    if  (fh != sys.stdin): fh.close()
-    return totals
-
-def doOneXmlFile(path:str):
-    """Parse and load
+        return countStream(sys.stdin.buffer)
+    try:
+        fh = open(path, "rb")
+    except OSError as e:
+        error("Cannot open '%s':\n    %s" % (path, e))
+        return None
+    with fh:
+        return countStream(fh)
+
+def countStream(fh) -> dict:
+    """Count a binary stream (file, pipe, stdin,...) a block at a time.
+    """
+    if (not needsDecoding()): return countRaw(fh)
+    return countBlocks(iter(lambda: fh.read(args.blockSize), b""))
+
+def countRaw(fh) -> dict:
+    """Count lines, bytes, and UTF-8 characters, with nothing to decode.
+    Blocks are read into one reused buffer, so there is no new block
+    (or page faults for one) per read. With only -b, a regular file is
+    not read at all: like `wc -c`, take its size from fstat.
+    """
+    tots = newTotals()
+    rawChars = args.characters and isUtf8()
+    if (not (args.lines or rawChars)):
+        st = os.fstat(fh.fileno())
+        if (stat.S_ISREG(st.st_mode)):
+            tots["byte"] = max(0, st.st_size - fh.tell())
+            return tots
+    buf = bytearray(args.blockSize)
+    with memoryview(buf) as view:
+        while (True):
+            n = fh.readinto(buf)
+            if (not n): break
+            tots["byte"] += n
+            tots["line"] += buf.count(b"\n", 0, n)
+            if (rawChars):
+                block = buf if (n == len(buf)) else bytes(view[:n])
+                tots["char"] += n if (block.isascii()) else \
+                    len(block.translate(None, utf8Continuation))
+    return tots
+
+def countBlocks(blocks, edges:dict=None) -> dict:
+    """Count an iterable of raw blocks. Lines and bytes come straight
+    from the blocks. UTF-8 characters are counted without decoding, as
+    the bytes that are not continuation bytes (all of them, if the block
+    is ASCII). Words are counted by a TextCounter, which only decodes
+    what the word definition requires.
+    If 'edges' is given, set its "first" and "last" to whether the text
+    starts and ends inside a word (for mergeRanges()).
+    """
+    tots = newTotals()
+    rawChars = args.characters and isUtf8()
+    counter = None
+    if (needsDecoding()):
+        decoder = codecs.getincrementaldecoder(args.iencoding)(errors="replace")
+        counter = TextCounter(tots, countChars=not rawChars, decoder=decoder)
+    for buf in blocks:
+        tots["byte"] += len(buf)
+        tots["line"] += buf.count(b"\n")
+        if (rawChars):
+            tots["char"] += len(buf) if (buf.isascii()) else \
+                len(buf.translate(None, utf8Continuation))
+        if (counter): counter.feedBytes(buf)
+    if (counter): counter.finish()
+    if (edges is not None and counter):
+        edges["first"] = counter.startsInWord
+        edges["last"] = counter.inWord
+    return tots
+
+###############################################################################
+# XML and HTML. Only text content is counted, as it streams through the
+# parser, so memory use does not grow with the document. Markup ends any
+# word in progress. Lines and bytes are those of the text itself.
+#
+def doOneXmlFile(path:str) -> dict:
+    """Count the text content of an XML (or, by extension, HTML) file.
+    Returns its totals, or None if it cannot be read or parsed.
+    """
+    _name, ext = os.path.splitext(path)
+    tots = newTotals()
+    counter = TextCounter(tots)
+    try:
+        with open(path, "rb") as fh:
+            if (ext in [ ".html", ".htm" ]):
+                countHtml(fh, counter)
+            else:
+                countXml(fh, counter)
+    except OSError as e:
+        error("Cannot open '%s':\n    %s" % (path, e))
+        return None
+    except ET.ParseError as e:
+        error("Cannot parse '%s': %s" % (path, e))
+        return None
+    counter.finish()
+    return tots
+
+def countXmlText(counter:TextCounter, txt:str, newRun:bool=True) -> None:
+    """Count a piece of text. Unless it continues the previous piece
+    (newRun=False), it starts after markup, so ends any word in progress.
+    """
+    if (not txt): return
+    counter.tots["line"] += txt.count("\n")
+    counter.tots["byte"] += len(txt.encode(args.iencoding, errors="replace"))
+    if (newRun): counter.breakWord()
+    counter.feed(txt)
+
+def countXml(fh, counter:TextCounter) -> None:
+    """Count text from XMLPullParser events, in document order. A piece
+    of text is complete at the next start or end tag: it is the .text
+    of the open element (before its first child) or the .tail of its
+    previous child. Children are deleted once their tails are counted
+    (in bunches, since the parser may have added many more by then).
     """
-    from xml.dom import minidom
-    from domextensions import DomExtensions
-    DomExtensions.patchDom(minidom.Node)
-    xdoc = minidom.parse(path)
-    docEl = xdoc.documentElement
-    for nodeNum, txt in enumerate(getTextNodes(docEl)):
-        countRec(path, nodeNum, txt)
-    return totals
-
-def getTextNodes(node:Node) -> str:
-    if (node.nodeType in [ Node.TEXT_NODE, Node.CDATA_SECTION_NODE ]):
-        yield node.data
-    elif (node.nodeType == Node.ELEMENT_NODE):
-        for ch in node.childNodes:
-            yield getTextNodes(ch)
-    return
+    parser = ET.XMLPullParser(events=("start", "end"))
+    stack = []  # [ element, last child so far, n children done ] per open element
+
+    def handleEvents():
+        for event, elem in parser.read_events():
+            if (stack):  # Count the text just before this tag
+                top = stack[-1]
+                if (top[1] is None):
+                    countXmlText(counter, top[0].text)
+                    top[0].text = None
+                else:
+                    countXmlText(counter, top[1].tail)
+                    top[2] += 1
+                    if (top[2] >= 1000):
+                        del top[0][:top[2]]
+                        top[2] = 0
+            if (event == "start"):
+                if (stack): stack[-1][1] = elem
+                stack.append([ elem, None, 0 ])
+            else:
+                stack.pop()
+                del elem[:]
+                elem.attrib.clear()
+
+    for buf in iter(lambda: fh.read(args.blockSize), b""):
+        parser.feed(buf)
+        handleEvents()
+    parser.close()
+    handleEvents()
+
+class HtmlTextCounter(HTMLParser):
+    """Pass the text of an HTML document (except scripts and styles)
+    to a TextCounter. HTMLParser may deliver one run of text in several
+    handle_data() calls (say, where it crosses a feed() boundary), so
+    words are only broken at markup.
+    """
+    def __init__(self, counter:TextCounter):
+        super().__init__(convert_charrefs=True)
+        self.counter = counter
+        self.skipDepth = 0
+        self.afterMarkup = True
+
+    def handle_starttag(self, tag, attrs):
+        self.afterMarkup = True
+        if (tag in [ "script", "style" ]): self.skipDepth += 1
+
+    def handle_endtag(self, tag):
+        self.afterMarkup = True
+        if (tag in [ "script", "style" ] and self.skipDepth > 0):
+            self.skipDepth -= 1
+
+    def handle_comment(self, data):
+        self.afterMarkup = True
+
+    def handle_decl(self, decl):
+        self.afterMarkup = True
+
+    def handle_pi(self, data):
+        self.afterMarkup = True
+
+    def unknown_decl(self, data):
+        self.afterMarkup = True
+
+    def handle_data(self, data):
+        if (self.skipDepth or not data): return
+        countXmlText(self.counter, data, newRun=self.afterMarkup)
+        self.afterMarkup = False
+
+def countHtml(fh, counter:TextCounter) -> None:
+    parser = HtmlTextCounter(counter)
+    decoder = codecs.getincrementaldecoder(args.iencoding)(errors="replace")
+    for buf in iter(lambda: fh.read(args.blockSize), b""):
+        parser.feed(decoder.decode(buf))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
 
 
 ###############################################################################
@@ -177,6 +847,16 @@ def getTextNodes(node:Node) -> str:
 if __name__ == "__main__":
     import argparse
 
+    def parseSize(s:str) -> int:
+        """Parse a byte count with an optional K, M, G, or T (powers of 1024).
+        """
+        s = s.strip().upper().rstrip("B").rstrip("I")
+        mult = 1
+        if (s and s[-1] in "KMGT"):
+            mult = 1024 ** ("KMGT".index(s[-1]) + 1)
+            s = s[:-1]
+        return int(float(s) * mult)
+
     def processOptions() -> argparse.Namespace:
         try:
             from BlockFormatter import BlockFormatter
@@ -185,6 +865,9 @@ if __name__ == "__main__":
         except ImportError:
             parser = argparse.ArgumentParser(description=descr)
 
+        parser.add_argument(
+            "--blockSize", "--block-size", type=parseSize, default=1<<20, metavar="N",
+            help="Read files N bytes at a time. Default: 1MiB.")
         parser.add_argument(
             "--bytes", "-b", action="store_true",
             help="Count bytes.")
@@ -192,26 +875,35 @@ if __name__ == "__main__":
             "--characters", "--chars", "-m", "-c", action="store_true",
             help="Count characters (see also --iencoding).")
         parser.add_argument(
-            "--filenames", "-f", action="store_true",
+            "--countCache", "--count-cache", type=str, metavar="PATH",
+            help="Keep counts in SQLite file PATH, and reuse them for unchanged files.")
+        parser.add_argument(
+            "--filenames", "-f", action="store_true", dest="fileNames", default=True,
             help="Display individual file names (the default).")
         parser.add_argument(
             "--no-filenames", "--nf", "-n", action="store_false", dest="fileNames",
             help="Do NOT display individual file names.")
         parser.add_argument(
-            "--grandTotals", "-g", action="store_true",
+            "--grandTotals", "-g", action="store_true", default=True,
             help="Display grand totals across all input files (default).")
         parser.add_argument(
             "--no-grandTotals", "--ng", action="store_false", dest="grandTotals",
-            help="Display grand totals across all input files (default).")
+            help="Do NOT display grand totals.")
         parser.add_argument(
             "--iencoding", type=str, metavar="E", default="utf-8",
             help="Assume this character coding for input. Default: utf-8.")
+        parser.add_argument(
+            "--jobs", "-j", type=int, default=1, metavar="N",
+            help="Count files in N worker processes.")
         parser.add_argument(
             "--lines", "-l", action="store_true",
             help="Count lines.")
         parser.add_argument(
             "--quiet", "-q", action="store_true",
             help="Suppress most messages.")
+        parser.add_argument(
+            "--splitSize", "--split-size", type=parseSize, default=128<<20, metavar="N",
+            help="With --jobs, count files over N bytes in N-byte pieces (0: never). Default: 128MiB.")
         parser.add_argument(
             "--unicode", action="store_const", dest="iencoding",
             const="utf8", help="Assume utf-8 for input files.")
@@ -222,8 +914,15 @@ if __name__ == "__main__":
             "--version", action="version", version=__version__,
             help="Display version information, then exit.")
         parser.add_argument(
-            "--words", "-", action="store_true",
-            help="Count words, according to a rudimentary definition.")
+            "--wordDef", "--word-def", type=str, default="whitespace",
+            choices=list(wordDefs.keys()) + [ "regex" ],
+            help="What counts as a word (see above). Default: whitespace.")
+        parser.add_argument(
+            "--wordRegex", "--word-regex", type=str, metavar="REGEX",
+            help="With --wordDef regex, count matches of REGEX as words.")
+        parser.add_argument(
+            "--words", "-w", action="store_true",
+            help="Count words (see --wordDef).")
 
         PowerWalk.addOptionsToArgparse(parser)
 
@@ -234,6 +933,19 @@ if __name__ == "__main__":
         args0 = parser.parse_args()
         if (not (args0.bytes | args0.characters | args0.words | args0.lines)):
             args0.bytes = args0.characters = args0.words = args0.lines = True
+        if (args0.wordRegex and args0.wordDef == "whitespace"):
+            args0.wordDef = "regex"
+        if (args0.wordDef == "regex"):
+            if (not args0.wordRegex):
+                parser.error("--wordDef regex needs --wordRegex.")
+            try:
+                re.compile(args0.wordRegex)
+            except re.error as e:
+                parser.error("Bad --wordRegex '%s': %s" % (args0.wordRegex, e))
+        if (args0.jobs < 1):
+            parser.error("--jobs must be at least 1.")
+        if (args0.blockSize < 1):
+            parser.error("--blockSize must be positive.")
         return(args0)
 
     ###########################################################################
@@ -241,24 +953,32 @@ if __name__ == "__main__":
     args = processOptions()
 
     if (len(args.files) == 0):
-        lg.info("wcPP.py: No files specified....")
-        doOneFile(None)
+        warning1("wcPP.py: No files specified....")
+        report(doOneFile(None), None)
     else:
         pw = PowerWalk(args.files, open=False, close=False,
             encoding=args.iencoding)
         pw.applyOptionsFromArgparse(args)
-        for path0, fh0, what0 in pw.traverse():
-            if (what0 != PWType.LEAF): continue
-            _name, ext = os.path.splitext(path0)
-            if (ext in [ ".xml", ".html", ".htm" ]):
-                doOneXmlFile(path0)
-            else:
-                doOneFile(path0)
-            report(totals, path0)
-            for gtk in grandTotals.keys():
-                grandTotals[gtk] += totals[gtk]
+        if (args.jobs > 1):
+            pool = ProcessPoolExecutor(max_workers=args.jobs,
+                initializer=initWorker, initargs=(args,))
+        if (args.countCache):
+            countCache = CountCache(args.countCache)
+        try:
+            for path0, fh0, what0 in pw.traverse():
+                if (what0 != PWType.LEAF): continue
+                dispatchCount(path0)
+            finishAll()
+        finally:
+            if (pool is not None):
+                if (sys.version_info >= (3, 9)): pool.shutdown(cancel_futures=True)
+                else: pool.shutdown()  # Queued batches still run on error
+            if (countCache): countCache.close()
 
         if (args.grandTotals):
-            report(grandTotals, args.grandLabel)
+            report(grandTotals, getattr(args, "grandLabel", None) or "total")
         if (not args.quiet):
-            lg.info("wcPP.py: Done, %d files.\n", pw.getStat("regular"))
+            warning1("wcPP.py: Done, %d files." % (pw.getStat("regular")))
+            if (countCache):
+                warning1("Count cache: %d hits, %d misses." %
+                    (countCache.hits, countCache.misses))
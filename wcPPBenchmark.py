@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+#
+# wcPPBenchmark.py: Time wcPP.py's word definitions and counting engines.
+# 2026-10-17: Written by Steven J. DeRose.
+#
+import sys
+import os
+import re
+import time
+import random
+import codecs
+import argparse
+
+__metadata__ = {
+    "title"        : "wcPPBenchmark",
+    "description"  : "Time wcPP.py's word definitions and counting engines.",
+    "rightsHolder" : "Steven J. DeRose",
+    "creator"      : "http://viaf.org/viaf/50334488",
+    "type"         : "http://purl.org/dc/dcmitype/Software",
+    "language"     : "Python 3.7",
+    "created"      : "2026-10-17",
+    "modified"     : "2026-10-17",
+    "publisher"    : "http://github.com/sderose",
+    "license"      : "https://creativecommons.org/licenses/by-sa/3.0/"
+}
+__version__ = __metadata__["modified"]
+
+descr = """
+=Description=
+
+Count words in the same text with each of `wcPP.py`'s `--wordDef`
+definitions, and each of several ways of doing the counting, and
+report the word counts, time, and MB/s:
+
+* ''wcPP'' -- what `wcPP.py` itself does (`countBlocks()`): pure-ASCII
+blocks (and, for ''whitespace'', UTF-8 blocks with no non-ASCII spaces)
+are counted with `bytes.translate()` and `count()`, without decoding.
+* ''decoded'' -- decode every block, then count with the definition's
+`countText()` (`str.split()` or `re.findall()`).
+* ''finditer'' -- decode, then count matches one at a time with
+`re.finditer()`, never building a list.
+* ''perLine'' -- decode and count a line at a time, with `re.split()`
+or `re.findall()`, as wcPP used to.
+
+All the engines should give the same count for a given definition;
+any that does not is flagged.
+
+The text is the files given, or else `--size` bytes of generated text,
+either plain ASCII or (with `--unicode`) mixed with non-ASCII
+letters, punctuation, and spaces. The text is read into memory first, so
+only counting is timed.
+
+==Usage==
+
+    wcPPBenchmark.py [--size 64M] [--unicode] [files]
+
+=Related Commands=
+
+`wcPP.py`, `cpPPBenchmark.py`.
+
+=Known bugs and Limitations=
+
+Needs `wcPP.py` (and its PowerWalk dependency) in the same directory.
+
+=History=
+
+* 2026-10-17: Written by Steven J. DeRose.
+
+=Rights=
+
+Copyright 2026-10-17 by Steven J. DeRose. This work is licensed under a
+Creative Commons Attribution-Share-alike 3.0 unported license.
+See [http://creativecommons.org/licenses/by-sa/3.0/] for more information.
+
+For the most recent version, see [http://www.derose.net/steve/utilities]
+or [https://github.com/sderose].
+
+=Options=
+"""
+
+def log(lvl:int, msg:str) -> None:
+    if (args.verbose >= lvl): sys.stderr.write(msg + "\n")
+def warning0(msg:str) -> None: log(0, msg)
+def warning1(msg:str) -> None: log(1, msg)
+def warning2(msg:str) -> None: log(2, msg)
+def error(msg:str) -> None: log(0, msg)
+def fatal(msg:str) -> None: log(0, msg); sys.exit()
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import wcPP
+
+asciiWords = [ "the", "of", "and", "a", "to", "in", "is", "you", "that",
+    "it", "he", "was", "for", "on", "are", "as", "with", "his", "they",
+    "I", "at", "be", "this", "have", "from", "or", "one", "had", "by",
+    "word", "but", "not", "what", "all", "were", "we", "when", "your",
+    "can", "said", "there", "use", "an", "each", "which", "she", "do",
+    "how", "their", "if", "3.14", "x_1", "e-mail", "don't", "(see", "it)." ]
+unicodeWords = [ "naïve", "café", "Straße", "日本語", "Ελληνικά", "привет",
+    "“quoted”", "—", "1,000", "🙂", "a b", "x　y", "end " ]
+separators = [ " ", " ", " ", " ", " ", "  ", "\n", "\t", ", ", ". " ]
+
+
+###############################################################################
+#
+def makeText(size:int, unicode:bool) -> bytes:
+    """Generate about 'size' bytes of UTF-8 text.
+    """
+    rnd = random.Random(1)
+    words = asciiWords + (unicodeWords if (unicode) else [])
+    parts = []
+    n = 0
+    while (n < size):
+        w = rnd.choice(words) + rnd.choice(separators)
+        parts.append(w)
+        n += len(w)
+    return "".join(parts).encode("utf-8")[:size]
+
+def blocksOf(data:bytes, blockSize:int) -> list:
+    return [ data[i:i+blockSize] for i in range(0, len(data), blockSize) ]
+
+def engineWcPP(blocks:list, wordDef:str) -> int:
+    return wcPP.countBlocks(blocks)["word"]
+
+def engineDecoded(blocks:list, wordDef:str) -> int:
+    tots = wcPP.newTotals()
+    counter = wcPP.TextCounter(tots, countChars=False)
+    decoder = codecs.getincrementaldecoder(args.iencoding)(errors="replace")
+    for buf in blocks:
+        counter.feed(decoder.decode(buf))
+    counter.feed(decoder.decode(b"", final=True))
+    counter.finish()
+    return tots["word"]
+
+def engineFinditer(blocks:list, wordDef:str) -> int:
+    regex = re.compile(patterns[wordDef])
+    text = b"".join(blocks).decode(args.iencoding, errors="replace")
+    return wcPP.countMatches(regex, text)
+
+def enginePerLine(blocks:list, wordDef:str) -> int:
+    text = b"".join(blocks).decode(args.iencoding, errors="replace")
+    n = 0
+    if (wordDef == "whitespace"):
+        for line in text.splitlines():
+            n += len([ tok for tok in re.split(r"\s+", line) if tok ])
+    else:
+        regex = re.compile(patterns[wordDef])
+        for line in text.splitlines():
+            n += len(regex.findall(line))
+    return n
+
+patterns = {
+    "whitespace": r"\S+",
+    "unicode":    r"\w+",
+    "alnum":      r"[^\W_]+",
+}
+
+engines = {
+    "wcPP":     engineWcPP,
+    "decoded":  engineDecoded,
+    "finditer": engineFinditer,
+    "perLine":  enginePerLine,
+}
+
+def timeEngine(engine, blocks:list, wordDef:str) -> (int, float):
+    """Run one engine --repeat times; return its count and best time.
+    """
+    best = None
+    for _i in range(args.repeat):
+        t0 = time.perf_counter()
+        n = engine(blocks, wordDef)
+        secs = time.perf_counter() - t0
+        if (best is None or secs < best): best = secs
+    return n, best
+
+
+###############################################################################
+# Main
+#
+if __name__ == "__main__":
+    def parseSize(s:str) -> int:
+        s = s.strip().upper().rstrip("B").rstrip("I")
+        mult = 1
+        if (s and s[-1] in "KMGT"):
+            mult = 1024 ** ("KMGT".index(s[-1]) + 1)
+            s = s[:-1]
+        return int(float(s) * mult)
+
+    def processOptions() -> argparse.Namespace:
+        try:
+            from BlockFormatter import BlockFormatter
+            parser = argparse.ArgumentParser(
+                description=descr, formatter_class=BlockFormatter)
+        except ImportError:
+            parser = argparse.ArgumentParser(description=descr)
+
+        parser.add_argument(
+            "--blockSize", "--block-size", type=parseSize, default=1<<20,
+            metavar="N", help="Count in blocks of N bytes. Default: 1MiB.")
+        parser.add_argument(
+            "--iencoding", type=str, metavar="E", default="utf-8",
+            help="Character encoding of the files. Default: utf-8.")
+        parser.add_argument(
+            "--quiet", "-q", action="store_true",
+            help="Suppress most messages.")
+        parser.add_argument(
+            "--repeat", type=int, default=3, metavar="N",
+            help="Run each engine N times and keep the best. Default: 3.")
+        parser.add_argument(
+            "--size", type=parseSize, default=32<<20, metavar="N",
+            help="Amount of text to generate (K, M, G suffixes ok). Default: 32M.")
+        parser.add_argument(
+            "--unicode", action="store_true",
+            help="Mix non-ASCII words and spaces into the generated text.")
+        parser.add_argument(
+            "--verbose", "-v", action="count", default=0,
+            help="Add more messages (repeatable).")
+        parser.add_argument(
+            "--version", action="version", version=__version__,
+            help="Display version information, then exit.")
+        parser.add_argument(
+            "files", type=str, nargs=argparse.REMAINDER,
+            help="Text to count (default: generated).")
+
+        args0 = parser.parse_args()
+        if (args0.repeat < 1):
+            parser.error("--repeat must be positive.")
+        return(args0)
+
+    ###########################################################################
+    #
+    args = processOptions()
+
+    if (args.files):
+        data = b""
+        for path0 in args.files:
+            with open(path0, "rb") as ifh: data += ifh.read()
+    else:
+        if (args.iencoding.lower().replace("-", "") != "utf8"):
+            fatal("Generated text is UTF-8; give files to test --iencoding %s."
+                % (args.iencoding))
+        data = makeText(args.size, args.unicode)
+    blocks = blocksOf(data, args.blockSize)
+    warning1("Counting %d bytes in %d blocks." % (len(data), len(blocks)))
+
+    # wcPP's functions take their settings from its module-level 'args'.
+    wcPP.args = argparse.Namespace(lines=False, words=True, characters=False,
+        bytes=False, iencoding=args.iencoding, wordDef=None, wordRegex=None,
+        blockSize=args.blockSize, verbose=args.verbose, quiet=args.quiet)
+
+    print("%-11s %-9s %10s %9s %9s" %
+        ("wordDef", "engine", "words", "seconds", "MB/s"))
+    for wordDef0 in wcPP.wordDefs:
+        wcPP.args.wordDef = wordDef0
+        expected = None
+        for ename, engine0 in engines.items():
+            n0, secs0 = timeEngine(engine0, blocks, wordDef0)
+            if (expected is None): expected = n0
+            flag = "" if (n0 == expected) else "  (differs)"
+            print("%-11s %-9s %10d %9.3f %9.1f%s" % (wordDef0, ename, n0,
+                secs0, len(data)/secs0/1e6, flag))